@@ -4,28 +4,31 @@ from telegram.ext import Application, CommandHandler, CallbackQueryHandler, Mess
 import sys
 sys.path.append('..')
 from admin_bot.admin_handlers import AdminHandlers
-from database.db_service import DatabaseService
 from database.knowledge_service import KnowledgeService
-from services.ai_service import AIService  # ← НОВЫЙ ИМПОРТ
+from services.ai_service import AIService
 import config
 
 
 class AdminBot:
     """Класс для управления админ-ботом"""
     
-    def __init__(self):
-        """Инициализация админ-бота"""
-        self.application = Application.builder().token(config.ADMIN_BOT_TOKEN).build()
+    def __init__(self, knowledge_service: KnowledgeService, ai_service: AIService = None, message_dispatcher=None):
+        """
+        Инициализация админ-бота
         
-        # Инициализация сервисов
-        self.db_service = DatabaseService(config.DATABASE_PATH)
-        self.knowledge_service = KnowledgeService(self.db_service)
+        Args:
+            knowledge_service: Общий сервис базы знаний
+            ai_service: Общий сервис AI для тестирования (опционально)
+            message_dispatcher: Диспетчер сообщений пользовательского бота для статистики (опционально)
+        """
+        self.application = Application.builder().token(config.ADMIN_BOT_TOKEN).build()
         
-        # НОВОЕ: Инициализация AI сервиса для тестирования
-        self.ai_service = AIService(self.knowledge_service)
+        # Сервисы создаются один раз в ServiceContainer и передаются снаружи
+        self.knowledge_service = knowledge_service
+        self.ai_service = ai_service
         
         # Инициализация обработчиков с AI сервисом
-        self.handlers = AdminHandlers(self.knowledge_service, self.ai_service)  # ← ИЗМЕНЕНО
+        self.handlers = AdminHandlers(self.knowledge_service, self.ai_service, message_dispatcher)  # ← ИЗМЕНЕНО
         
         # Регистрация обработчиков
         self._register_handlers()
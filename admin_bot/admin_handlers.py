@@ -11,15 +11,17 @@ import config
 class AdminHandlers:
     """Класс для обработки команд администратора"""
     
-    def __init__(self, knowledge_service: KnowledgeService, ai_service=None):
+    def __init__(self, knowledge_service: KnowledgeService, ai_service=None, message_dispatcher=None):
         """
         Инициализация обработчиков админки
         Args:
             knowledge_service: Сервис базы знаний
             ai_service: Сервис AI для тестирования (опционально)
+            message_dispatcher: Диспетчер сообщений для статистики очередей (опционально)
         """
         self.knowledge_service = knowledge_service
         self.ai_service = ai_service
+        self.message_dispatcher = message_dispatcher
         # НОВОЕ: Инициализация VPS сервиса
         self.vps_service = VPSService(
             host=config.VPS_HOST,
@@ -101,6 +103,8 @@ class AdminHandlers:
             await self.remove_from_blacklist(query, context)
         elif query.data == "restart_vps":  # НОВАЯ СТРОКА
             await self.restart_vps_process(query, context)  # НОВАЯ СТРОКА
+        elif query.data.startswith("search_page_"):
+            await self.show_search_page(query, context)
         elif query.data == "back_to_menu":
             await self.back_to_menu(query, context)
         elif query.data.startswith("delete_"):
@@ -203,6 +207,32 @@ class AdminHandlers:
         for cat, count in categories.items():
             text += f"• {cat}: {count}\n"
         
+        cache_stats = self.knowledge_service.get_query_cache_stats()
+        text += "\n*Кэш embeddings запросов:*\n"
+        text += f"• Записей: {cache_stats['size']}\n"
+        text += f"• Попаданий: {cache_stats['hits']} ({cache_stats['hit_rate']:.0%})\n"
+        text += f"• Промахов: {cache_stats['misses']}\n"
+        text += f"• Вытеснено: {cache_stats['evictions']}\n"
+        
+        response_stats = self.ai_service.get_response_cache_stats() if self.ai_service else {}
+        if response_stats:
+            text += "\n*Кэш ответов AI:*\n"
+            text += f"• Ответов: {response_stats['size']}\n"
+            text += f"• Попаданий: {response_stats['hits']} ({response_stats['hit_rate']:.0%})\n"
+            text += f"• Промахов: {response_stats['misses']}\n"
+            text += f"• Сброшено при изменении базы: {response_stats['invalidations']}\n"
+        
+        if self.message_dispatcher:
+            queue_stats = self.message_dispatcher.get_stats()
+            queue_wait = queue_stats['queue_wait']
+            slot_wait = queue_stats['llm_slot_wait']
+            text += "\n*Очередь сообщений:*\n"
+            text += f"• Запросов к LLM: {queue_stats['llm_in_flight']} из {queue_stats['llm_limit']}, ждут: {queue_stats['llm_waiting']}\n"
+            text += f"• В очередях: {queue_stats['queued']} (пользователей: {queue_stats['active_users']}, макс. глубина: {queue_stats['max_queue_depth_seen']})\n"
+            text += f"• Ожидание в очереди: p50 {queue_wait['p50']:.1f} с, p95 {queue_wait['p95']:.1f} с\n"
+            text += f"• Ожидание LLM: p50 {slot_wait['p50']:.1f} с, p95 {slot_wait['p95']:.1f} с\n"
+            text += f"• Обработано: {queue_stats['processed']}, ошибок: {queue_stats['failed']}, пропущено: {queue_stats['dropped']}\n"
+        
         keyboard = [[InlineKeyboardButton("⬅️ Назад", callback_data="back_to_menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
@@ -302,7 +332,7 @@ class AdminHandlers:
             content = update.message.text
             
             # Добавляем знание в базу
-            knowledge_id = self.knowledge_service.add_knowledge(category, topic, content)
+            knowledge_id = await self.knowledge_service.add_knowledge_async(category, topic, content)
             
             context.user_data.clear()
             
@@ -395,7 +425,7 @@ class AdminHandlers:
             topic = context.user_data['new_topic']
             
             # Обновляем знание в базе
-            success = self.knowledge_service.update_knowledge(knowledge_id, category, topic, new_content)
+            success = await self.knowledge_service.update_knowledge_async(knowledge_id, category, topic, new_content)
             
             context.user_data.clear()
             
@@ -417,22 +447,68 @@ class AdminHandlers:
     async def handle_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка поиска"""
         search_term = update.message.text
-        results = self.knowledge_service.search_knowledge(search_term)
+        
+        context.user_data.clear()
+        # Сохраняем запрос для перелистывания страниц результатов
+        context.user_data['search_term'] = search_term
+        
+        text, reply_markup = self._render_search_page(search_term, 0)
+        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    
+    async def show_search_page(self, query, context):
+        """Переход на другую страницу результатов поиска"""
+        search_term = context.user_data.get('search_term')
+        
+        if not search_term:
+            keyboard = [[InlineKeyboardButton("⬅️ В меню", callback_data="back_to_menu")]]
+            await query.edit_message_text(
+                "❌ Поиск устарел. Начните новый поиск из меню.",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+            return
+        
+        page = int(query.data.replace("search_page_", ""))
+        text, reply_markup = self._render_search_page(search_term, page)
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+    
+    def _render_search_page(self, search_term: str, page: int) -> tuple:
+        """
+        Формирование текста и кнопок для страницы результатов поиска
+        
+        Args:
+            search_term: Поисковый запрос
+            page: Номер страницы (с нуля)
+            
+        Returns:
+            Кортеж (text: str, reply_markup: InlineKeyboardMarkup)
+        """
+        page_size = config.ADMIN_SEARCH_PAGE_SIZE
+        total = self.knowledge_service.count_search_results(search_term)
+        results = self.knowledge_service.search_knowledge(
+            search_term, limit=page_size, offset=page * page_size
+        )
         
         if not results:
             text = f"🔍 По запросу '{search_term}' ничего не найдено."
         else:
-            text = f"🔍 *Результаты поиска по '{search_term}':*\n\n"
-            for item in results[:5]:
+            pages = (total + page_size - 1) // page_size
+            text = f"🔍 *Результаты поиска по '{search_term}'* (стр. {page + 1}/{pages}, всего {total}):\n\n"
+            for item in results:
                 text += f"🆔 ID: {item['id']}\n"
                 text += f"📂 {item['category']} - {item['topic']}\n"
-                text += f"📝 {item['content'][:100]}...\n\n"
+                text += f"📝 {item.get('snippet') or item['content'][:100]}...\n\n"
         
-        keyboard = [[InlineKeyboardButton("⬅️ В меню", callback_data="back_to_menu")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        context.user_data.clear()
-        
-        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode='Markdown')
+        keyboard = []
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("◀️ Назад", callback_data=f"search_page_{page - 1}"))
+        if (page + 1) * page_size < total:
+            navigation.append(InlineKeyboardButton("Далее ▶️", callback_data=f"search_page_{page + 1}"))
+        if navigation:
+            keyboard.append(navigation)
+        keyboard.append([InlineKeyboardButton("⬅️ В меню", callback_data="back_to_menu")])
+        
+        return text, InlineKeyboardMarkup(keyboard)
     
     async def handle_delete(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработка удаления"""
@@ -445,7 +521,7 @@ class AdminHandlers:
             if not knowledge:
                 text = f"❌ Знание с ID {knowledge_id} не найдено."
             else:
-                deleted = self.knowledge_service.delete_knowledge(knowledge_id)
+                deleted = await self.knowledge_service.delete_knowledge_async(knowledge_id)
                 
                 if deleted:
                     text = (
@@ -469,7 +545,7 @@ class AdminHandlers:
     async def confirm_delete(self, query, context):
         """Подтверждение удаления"""
         knowledge_id = int(query.data.split('_')[1])
-        deleted = self.knowledge_service.delete_knowledge(knowledge_id)
+        deleted = await self.knowledge_service.delete_knowledge_async(knowledge_id)
         
         if deleted:
             text = f"✅ Знание с ID {knowledge_id} удалено!"
@@ -615,7 +691,7 @@ class AdminHandlers:
                 return result
             
             # Парсинг и добавление в базу
-            success, message, knowledge_id = self.knowledge_service.add_knowledge_from_file(text_content)
+            success, message, knowledge_id = await self.knowledge_service.add_knowledge_from_file_async(text_content)
             
             result['success'] = success
             result['message'] = message
@@ -753,10 +829,10 @@ class AdminHandlers:
         
         try:
             # Генерируем ответ через AI (как для обычного пользователя)
-            ai_response = self.ai_service.generate_response(user_message, user_name)
+            ai_response = await self.ai_service.generate_response(user_message, user_name)
             
             # Получаем информацию о контексте
-            context_info = self.knowledge_service.get_context_for_ai()
+            context_info = await self.knowledge_service.get_context_for_ai_async()
             context_length = len(context_info)
             
             keyboard = [
@@ -0,0 +1,164 @@
+"""Сравнение бэкендов модели embeddings: задержка, пропускная способность и совместимость векторов
+
+Запуск из корня проекта:
+    python benchmarks/embedding_backend_benchmark.py [--backends torch onnx onnx-int8]
+        [--quantization avx2] [--threads 2] [--db knowledge_base.db] [--samples 200]
+
+Тексты берутся из фрагментов базы знаний (только чтение), при их отсутствии — встроенные примеры.
+Совместимость — среднее косинусное сходство с векторами первого бэкенда в списке.
+"""
+
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+import numpy as np
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+import config
+from services.embedding_backends import load_embedding_model
+
+SAMPLE_TEXTS = [
+    "Как создать сделку через REST API Битрикс24?",
+    "CRM в Битрикс24 позволяет управлять лидами, контактами, компаниями и сделками.",
+    "Не приходят уведомления о новых задачах на почту",
+    "Модуль задач поддерживает Kanban-доски, диаграммы Ганта и Scrum.",
+    "Ошибка 403 при вызове метода crm.deal.add через вебхук",
+    "Битрикс24.Диск поддерживает совместное редактирование и контроль версий.",
+]
+
+
+def load_texts(db_path: str, limit: int) -> list:
+    """
+    Тексты для кодирования: фрагменты базы знаний или встроенные примеры
+    
+    Args:
+        db_path: Путь к БД знаний
+        limit: Максимальное количество текстов
+    
+    Returns:
+        Список текстов
+    """
+    if os.path.exists(db_path):
+        try:
+            conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            rows = conn.execute(
+                "SELECT c.content FROM knowledge_chunk c ORDER BY c.id LIMIT ?", (limit,)
+            ).fetchall()
+            conn.close()
+            if rows:
+                return [row[0] for row in rows]
+        except sqlite3.Error as e:
+            print(f"Не удалось прочитать фрагменты из БД, используются примеры: {e}")
+    
+    return (SAMPLE_TEXTS * (limit // len(SAMPLE_TEXTS) + 1))[:limit]
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    Нормализация строк матрицы к единичной длине
+    
+    Args:
+        vectors: Матрица embeddings
+    
+    Returns:
+        Нормализованная матрица float32
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def benchmark_backend(name: str, texts: list, threads: int, quantization: str,
+                      single_runs: int, batch_size: int) -> dict:
+    """
+    Замер одного бэкенда
+    
+    Args:
+        name: 'torch', 'onnx' или 'onnx-int8'
+        texts: Тексты для кодирования
+        threads: Потоков на одну операцию
+        quantization: Конфигурация int8 квантизации для onnx-int8
+        single_runs: Количество одиночных запросов для замера задержки
+        batch_size: Размер пачки для замера пропускной способности
+    
+    Returns:
+        Словарь с результатами и векторами
+    """
+    backend = 'torch' if name == 'torch' else 'onnx'
+    
+    started_at = time.perf_counter()
+    model = load_embedding_model(
+        config.EMBEDDING_MODEL, backend, threads,
+        quantization if name == 'onnx-int8' else None
+    )
+    load_time = time.perf_counter() - started_at
+    
+    # Прогрев: первые вызовы инициализируют буферы и потоки
+    model.encode(texts[:batch_size], batch_size=batch_size)
+    
+    latencies = []
+    for i in range(single_runs):
+        started_at = time.perf_counter()
+        model.encode([texts[i % len(texts)]], batch_size=1)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    latencies.sort()
+    
+    started_at = time.perf_counter()
+    vectors = model.encode(texts, batch_size=batch_size)
+    batch_time = time.perf_counter() - started_at
+    
+    return {
+        'name': name,
+        'load_s': load_time,
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+        'texts_per_s': len(texts) / batch_time if batch_time > 0 else 0.0,
+        'vectors': normalize_rows(vectors),
+    }
+
+
+def main():
+    """Точка входа бенчмарка"""
+    parser = argparse.ArgumentParser(description="Сравнение бэкендов модели embeddings")
+    parser.add_argument('--backends', nargs='+', default=['torch', 'onnx', 'onnx-int8'],
+                        choices=['torch', 'onnx', 'onnx-int8'], help="Бэкенды в порядке замера")
+    parser.add_argument('--quantization', default=config.EMBEDDING_ONNX_QUANTIZATION or 'avx2',
+                        help="Конфигурация int8 квантизации для onnx-int8")
+    parser.add_argument('--threads', type=int, default=config.EMBEDDING_INTRA_OP_THREADS,
+                        help="Потоков на одну операцию (0 — все ядра)")
+    parser.add_argument('--db', default=config.DATABASE_PATH, help="БД знаний с фрагментами")
+    parser.add_argument('--samples', type=int, default=200, help="Текстов для замера пропускной способности")
+    parser.add_argument('--single-runs', type=int, default=50, help="Одиночных запросов для замера задержки")
+    parser.add_argument('--batch-size', type=int, default=32, help="Размер пачки")
+    args = parser.parse_args()
+    
+    texts = load_texts(args.db, args.samples)
+    print(f"Текстов: {len(texts)}, потоков: {args.threads or 'по умолчанию'}\n")
+    
+    results = []
+    for name in args.backends:
+        try:
+            results.append(benchmark_backend(
+                name, texts, args.threads, args.quantization, args.single_runs, args.batch_size
+            ))
+        except Exception as e:
+            print(f"{name}: не удалось выполнить замер: {e}")
+    
+    if not results:
+        return
+    
+    reference = results[0]['vectors']
+    print(f"{'бэкенд':<12} {'загрузка, с':>12} {'p50, мс':>9} {'p95, мс':>9} {'текстов/с':>10} "
+          f"{'сходство с ' + results[0]['name']:>20}")
+    for result in results:
+        agreement = float(np.mean(np.sum(result['vectors'] * reference, axis=1)))
+        print(f"{result['name']:<12} {result['load_s']:>12.2f} {result['p50_ms']:>9.1f} "
+              f"{result['p95_ms']:>9.1f} {result['texts_per_s']:>10.1f} {agreement:>20.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Замер времени холодного старта: импорты, загрузка модели, индекс и первый ответ
+
+Запуск из корня проекта:
+    python benchmarks/startup_benchmark.py [--db knowledge_base.db] [--question "..."] [--llm]
+
+БД и файлы embeddings копируются во временный каталог, рабочие файлы не меняются.
+"""
+
+import argparse
+import asyncio
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+import config
+
+# Тяжёлые пакеты, импорт которых раньше выполнялся при старте целиком
+HEAVY_IMPORTS = ['sentence_transformers', 'telethon', 'telegram', 'openai', 'services.service_container']
+
+
+def measure_import(module: str) -> float:
+    """
+    Время импорта модуля в отдельном процессе (без кэша уже загруженных зависимостей)
+    
+    Args:
+        module: Имя модуля
+    
+    Returns:
+        Время импорта в секундах или -1, если модуль не установлен
+    """
+    code = (
+        "import time; started_at = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - started_at)"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=PROJECT_ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return -1.0
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def copy_database(db_path: str, target_dir: str) -> str:
+    """
+    Копирование БД вместе с WAL, файлами embeddings и ANN-индекса во временный каталог
+    
+    Args:
+        db_path: Путь к исходной БД
+        target_dir: Каталог назначения
+    
+    Returns:
+        Путь к копии БД
+    """
+    target = os.path.join(target_dir, os.path.basename(db_path))
+    for path in [db_path, f"{db_path}-wal"] + glob.glob(f"{db_path}.embeddings.*") + glob.glob(f"{db_path}.ann.*"):
+        if os.path.exists(path):
+            shutil.copy2(path, os.path.join(target_dir, os.path.basename(path)))
+    return target
+
+
+async def measure_startup(db_path: str, question: str, with_llm: bool) -> dict:
+    """
+    Замер этапов старта сервисов в текущем процессе
+    
+    Args:
+        db_path: Путь к БД (копии)
+        question: Вопрос для первого ответа
+        with_llm: Выполнять ли запрос к LLM
+    
+    Returns:
+        Словарь с длительностями этапов в секундах
+    """
+    timings = {}
+    started_at = time.perf_counter()
+    
+    from services.service_container import ServiceContainer
+    timings['import_services'] = time.perf_counter() - started_at
+    
+    services = ServiceContainer(db_path)
+    services.start_warm_up()
+    timings['services_ready_to_connect'] = time.perf_counter() - started_at
+    
+    try:
+        # Первый ответ ждёт прогрева так же, как ранние сообщения в боте
+        first_started_at = time.perf_counter()
+        if with_llm:
+            await services.ai_service.generate_response(question)
+        else:
+            await services.ai_service._prepare_request(question)
+        timings['time_to_first_response'] = time.perf_counter() - started_at
+        
+        # Повторный запрос к прогретым сервисам для сравнения
+        second_started_at = time.perf_counter()
+        await services.knowledge_service.retrieve_knowledge_async(question + " ?")
+        timings['warm_retrieval'] = time.perf_counter() - second_started_at
+        timings['first_request_wait'] = second_started_at - first_started_at
+        
+        for stage, duration in services.knowledge_service.warm_up_timings.items():
+            timings[f'warm_up_{stage}'] = duration
+    finally:
+        services.close()
+    
+    return timings
+
+
+def main():
+    """Точка входа бенчмарка"""
+    parser = argparse.ArgumentParser(description="Бенчмарк времени старта бота")
+    parser.add_argument('--db', default=config.DATABASE_PATH, help="Путь к БД знаний")
+    parser.add_argument('--question', default="Как создать сделку через REST API?", help="Вопрос для первого ответа")
+    parser.add_argument('--llm', action='store_true', help="Включить запрос к LLM в первый ответ")
+    args = parser.parse_args()
+    
+    print("=== Импорт модулей (отдельный процесс на модуль) ===")
+    for module in HEAVY_IMPORTS:
+        duration = measure_import(module)
+        status = f"{duration:.2f} с" if duration >= 0 else "не установлен"
+        print(f"  {module:<30} {status}")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_copy = copy_database(args.db, tmp_dir)
+        if config.ANN_INDEX_PATH:
+            # Индекс по явному пути копируется вместе с метаданными
+            ann_path = os.path.join(tmp_dir, os.path.basename(config.ANN_INDEX_PATH))
+            for path, target in [(config.ANN_INDEX_PATH, ann_path),
+                                 (f"{config.ANN_INDEX_PATH}.json", f"{ann_path}.json")]:
+                if os.path.exists(path):
+                    shutil.copy2(path, target)
+            config.ANN_INDEX_PATH = ann_path
+        
+        timings = asyncio.run(measure_startup(db_copy, args.question, args.llm))
+    
+    print("\n=== Старт сервисов ===")
+    for stage, duration in timings.items():
+        print(f"  {stage:<30} {duration:.3f} с")
+
+
+if __name__ == '__main__':
+    main()
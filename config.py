@@ -26,6 +26,35 @@ AI_MODEL = "модель ИИ"
 
 # Настройки AI
 AI_MAX_TOKENS = 500
+AI_KNOWLEDGE_MAX_ITEMS = 3  # Записей базы знаний в одном промпте
+
+# Бюджет токенов промпта (без ответа)
+AI_PROMPT_TOKEN_BUDGET = 3000  # Всего: системный промпт + знания + история + вопрос
+AI_KNOWLEDGE_TOKEN_BUDGET = 2000  # Из них на записи базы знаний
+AI_KNOWLEDGE_MIN_SIMILARITY = 0.3  # Записи с меньшим косинусным сходством не попадают в промпт
+AI_HISTORY_MAX_MESSAGES = 6  # Максимум сообщений истории до применения бюджета
+AI_TOKENIZER_ENCODING = 'cl100k_base'  # Кодировка tiktoken для подсчёта токенов
+AI_CHARS_PER_TOKEN = 3.0  # Оценка, если tiktoken не установлен
+
+# Потоковая отправка ответа: первое сообщение по первым токенам, далее редактирование
+AI_STREAMING_ENABLED = True
+STREAM_EDIT_INTERVAL = 1.5  # Минимальный интервал между правками сообщения, секунд (лимиты Telegram)
+STREAM_MIN_CHARS_DELTA = 30  # Минимум новых символов для очередной правки
+
+# Очередь сообщений: у каждого пользователя по порядку, запросы к LLM — не больше лимита одновременно
+LLM_MAX_CONCURRENT_REQUESTS = 4
+USER_QUEUE_MAX_SIZE = 20  # Сообщений в очереди одного пользователя, лишние пропускаются (0 — без ограничения)
+DISPATCHER_SLOW_WAIT_SECONDS = 5.0  # Ожидание дольше порога выводится в лог
+
+# Склейка сообщений: серия сообщений одного пользователя подряд — один вопрос и один ответ
+MESSAGE_DEBOUNCE_SECONDS = 1.5  # Пауза после последнего сообщения до ответа (0 — без склейки)
+MESSAGE_DEBOUNCE_MAX_SECONDS = 5.0  # Максимальная задержка от первого сообщения серии
+
+# Семантический кэш ответов: близкие по смыслу вопросы получают сохранённый ответ
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_SIMILARITY = 0.95  # Минимальное косинусное сходство вопросов
+RESPONSE_CACHE_SIZE = 500
+RESPONSE_CACHE_TTL = 6 * 3600  # Время жизни ответа, секунд
 AI_SYSTEM_PROMPT = (
     "Ты — дружелюбный ассистент, который отвечает на сообщения пользователей в Telegram. "
     "Твои ответы должны быть краткими (до 500 символов), полезными и естественными. "
@@ -35,3 +64,74 @@ AI_SYSTEM_PROMPT = (
 
 # Настройки базы данных
 DATABASE_PATH = 'knowledge_base.db'
+
+# Кэш истории диалогов в памяти (кольцевой буфер на активного пользователя)
+HISTORY_BUFFER_SIZE = 20  # Последних сообщений на пользователя
+HISTORY_BUFFER_MAX_USERS = 1000  # Пользователей в памяти, сверх — вытеснение по LRU
+HISTORY_BUFFER_IDLE_TTL = 3600  # Через сколько секунд простоя буфер выгружается
+
+# Отложенная запись истории: сообщения копятся в очереди и пишутся одной транзакцией
+HISTORY_FLUSH_INTERVAL_MS = 200  # Максимальная задержка записи
+HISTORY_FLUSH_BATCH_SIZE = 100  # Запись сразу, как только накопилось столько сообщений
+
+# Хранение истории: старые сообщения переносятся в архивную БД фоновой задачей
+HISTORY_RETENTION_ENABLED = True
+HISTORY_RETENTION_DAYS = 90  # Сообщения старше переносятся в архив
+HISTORY_ARCHIVE_PATH = 'conversation_archive.db'
+HISTORY_RETENTION_BATCH_SIZE = 1000  # Строк за одну транзакцию переноса
+HISTORY_RETENTION_INTERVAL = 6 * 3600  # Период запуска задачи, секунд
+HISTORY_VACUUM_PAGES = 2000  # Страниц, освобождаемых incremental_vacuum за запуск (0 — все)
+
+# Настройки подключений SQLite (одно соединение на запись + пул соединений на чтение)
+SQLITE_READER_POOL_SIZE = 4
+SQLITE_JOURNAL_MODE = 'WAL'
+SQLITE_SYNCHRONOUS = 'NORMAL'
+SQLITE_CACHE_SIZE_KB = 64 * 1024  # Размер page cache на соединение
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # Байт файла БД, читаемых через mmap
+SQLITE_TEMP_STORE = 'MEMORY'
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# Гибридный поиск: лексический (FTS5) + семантический, объединение через Reciprocal Rank Fusion
+HYBRID_SEARCH_ENABLED = True
+HYBRID_SEMANTIC_TOP_K = 10  # Кандидатов из индекса embeddings
+HYBRID_LEXICAL_TOP_K = 10  # Кандидатов из полнотекстового индекса
+HYBRID_RRF_K = 60  # Сглаживающая константа RRF: score = sum(1 / (k + rank))
+
+# Настройки поиска в админке
+ADMIN_SEARCH_PAGE_SIZE = 5
+
+# Настройки embeddings
+EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+# Бэкенд модели: 'torch' (PyTorch) или 'onnx' (ONNX Runtime, быстрее на слабом CPU; нужен sentence-transformers>=3.2 с optimum[onnxruntime])
+EMBEDDING_BACKEND = 'torch'
+EMBEDDING_ONNX_QUANTIZATION = None  # Динамическая int8 квантизация ONNX: None, 'avx2', 'avx512', 'avx512_vnni' или 'arm64'
+EMBEDDING_ONNX_CACHE_DIR = 'models'  # Куда сохраняется экспортированная int8 модель
+EMBEDDING_INTRA_OP_THREADS = 0  # Потоков на одну операцию модели; 0 — по умолчанию (все ядра)
+EMBEDDING_BACKEND_MIN_AGREEMENT = 0.98  # Минимальное косинусное сходство с сохранёнными векторами, иначе torch
+EMBEDDING_MIGRATION_BATCH_SIZE = 500  # Строк за одну транзакцию при конвертации из pickle
+EMBEDDING_BACKFILL_BATCH_SIZE = 64  # Записей за один вызов encode и одну транзакцию при генерации
+EMBEDDING_BATCH_WINDOW_MS = 5  # Окно ожидания для объединения одновременных запросов в пачку
+EMBEDDING_MAX_BATCH_SIZE = 32  # Максимум текстов в одной пачке фонового воркера
+QUERY_EMBEDDING_CACHE_SIZE = 2048  # Embeddings запросов в LRU-кэше
+QUERY_EMBEDDING_CACHE_TTL = 24 * 3600  # Время жизни записи кэша, секунд
+
+# Фрагменты записей базы знаний: у каждого свой embedding, в контекст ИИ попадают фрагменты
+KNOWLEDGE_CHUNK_SIZE = 500  # Максимальная длина фрагмента, символов (MiniLM обрезает длинный ввод)
+KNOWLEDGE_CHUNK_OVERLAP = 100  # Перекрытие соседних фрагментов, символов
+KNOWLEDGE_PASSAGES_PER_ENTRY = 2  # Максимум фрагментов одной записи в результатах поиска
+
+# Матрица embeddings в файлах <БД>.embeddings.* рядом с БД: старт через mmap без чтения SQLite
+EMBEDDING_SIDECAR_ENABLED = True
+
+# Формат резидентного индекса: 'float32' (4 байта на измерение), 'float16' (2) или 'int8' (1 + масштаб на вектор).
+# В сжатых режимах лучшие кандидаты переоцениваются по полным embeddings из БД
+EMBEDDING_INDEX_DTYPE = 'float32'
+EMBEDDING_RESCORE_CANDIDATES = 50  # Размер шорт-листа для точной переоценки
+
+# Приближённый поиск (HNSW, требуется hnswlib) для больших баз знаний
+ANN_INDEX_ENABLED = False
+ANN_INDEX_PATH = None  # Файл индекса (None — <БД>.ann.hnsw рядом с БД); при старте сверяется с БД и дополняется
+ANN_MIN_ITEMS = 20000  # На меньшем числе фрагментов точный перебор быстрее и без потери полноты
+ANN_M = 16  # Связей на узел графа: больше — выше полнота и расход памяти
+ANN_EF_CONSTRUCTION = 200  # Ширина поиска при построении: больше — качественнее граф, медленнее вставка
+ANN_EF_SEARCH = 64  # Ширина поиска при запросе: больше — выше полнота, медленнее поиск
@@ -1,9 +1,15 @@
 """Сервис для работы с историей диалогов"""
 
-from typing import List, Dict
+from typing import List, Dict, Tuple
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+import asyncio
 import sys
+import threading
+import time
 sys.path.append('..')
 from database.db_service import DatabaseService
+import config
 
 
 class ConversationService:
@@ -17,11 +23,145 @@ class ConversationService:
             db_service: Сервис базы данных
         """
         self.db_service = db_service
+        
+        # Кольцевые буферы последних сообщений активных пользователей:
+        # user_id -> {'messages': deque, 'last_access': float}, порядок — от давно использованных
+        self.buffer_size = config.HISTORY_BUFFER_SIZE
+        self._buffers = OrderedDict()
+        self._buffers_lock = threading.Lock()
+        
+        # Очередь отложенной записи: строки вставляются пачками в фоновом потоке.
+        # Порядок захвата блокировок: _buffers_lock -> _flush_lock -> _pending_lock
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._pending_ready = threading.Condition(self._pending_lock)
+        self._flush_lock = threading.Lock()
+        self._stopping = False
+        self._writer_thread = threading.Thread(
+            target=self._run_writer, name="history-writer", daemon=True
+        )
+        self._writer_thread.start()
+    
+    def _run_writer(self):
+        """Фоновый поток: сброс очереди каждые HISTORY_FLUSH_INTERVAL_MS или по HISTORY_FLUSH_BATCH_SIZE строк"""
+        while True:
+            with self._pending_ready:
+                self._pending_ready.wait_for(
+                    lambda: self._stopping or len(self._pending) >= config.HISTORY_FLUSH_BATCH_SIZE,
+                    timeout=config.HISTORY_FLUSH_INTERVAL_MS / 1000
+                )
+                stopping = self._stopping
+            
+            self.flush()
+            
+            if stopping:
+                return
+    
+    def flush(self) -> int:
+        """
+        Запись накопленных сообщений в БД одной транзакцией
+        
+        Returns:
+            Количество записанных строк
+        """
+        query = '''
+            INSERT INTO conversation_history 
+            (user_id, username, user_first_name, role, message, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        '''
+        
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+            
+            if not batch:
+                return 0
+            
+            try:
+                self.db_service.execute_many(query, batch)
+            except Exception as e:
+                print(f"Ошибка при записи истории диалогов, {len(batch)} сообщений вернутся в очередь: {e}")
+                with self._pending_lock:
+                    self._pending[:0] = batch
+                return 0
+            
+            return len(batch)
+    
+    def get_queue_depth(self) -> int:
+        """
+        Количество сообщений, ожидающих записи в БД
+        
+        Returns:
+            Длина очереди отложенной записи
+        """
+        with self._pending_lock:
+            return len(self._pending)
+    
+    def close(self):
+        """Остановка фонового потока с записью всех накопленных сообщений"""
+        with self._pending_ready:
+            self._stopping = True
+            self._pending_ready.notify()
+        self._writer_thread.join()
+    
+    def _load_buffer(self, user_id: int) -> deque:
+        """
+        Получение буфера пользователя с ленивой загрузкой из SQLite при первом обращении
+        
+        Вызывается под self._buffers_lock.
+        
+        Args:
+            user_id: Telegram ID пользователя
+            
+        Returns:
+            Буфер последних сообщений (старые первыми)
+        """
+        entry = self._buffers.get(user_id)
+        
+        if entry is None:
+            query = '''
+                SELECT role, message, created_at
+                FROM conversation_history
+                WHERE user_id = ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            '''
+            # Пока держим _flush_lock, каждое сообщение либо уже в БД, либо ещё в очереди
+            with self._flush_lock:
+                rows = self.db_service.execute_query(query, (user_id, self.buffer_size))
+                with self._pending_lock:
+                    pending = [
+                        {'role': row[3], 'message': row[4], 'created_at': row[5]}
+                        for row in self._pending if row[0] == user_id
+                    ]
+            
+            messages = deque((dict(row) for row in reversed(rows)), maxlen=self.buffer_size)
+            messages.extend(pending)
+            entry = {
+                'messages': messages,
+                'last_access': 0.0,
+            }
+            self._buffers[user_id] = entry
+        
+        entry['last_access'] = time.monotonic()
+        self._buffers.move_to_end(user_id)
+        self._evict_buffers()
+        return entry['messages']
+    
+    def _evict_buffers(self):
+        """Вытеснение буферов по простою и по LRU (вызывается под self._buffers_lock)"""
+        idle_deadline = time.monotonic() - config.HISTORY_BUFFER_IDLE_TTL
+        
+        while self._buffers:
+            user_id, entry = next(iter(self._buffers.items()))
+            if len(self._buffers) <= config.HISTORY_BUFFER_MAX_USERS and entry['last_access'] >= idle_deadline:
+                break
+            del self._buffers[user_id]
     
     def add_message(self, user_id: int, username: str, user_first_name: str, 
                    role: str, message: str) -> int:
         """
-        Добавление сообщения в историю
+        Добавление сообщения в историю (запись в БД выполняется отложенно, пачками)
         
         Args:
             user_id: Telegram ID пользователя
@@ -31,16 +171,42 @@ class ConversationService:
             message: Текст сообщения
             
         Returns:
-            ID добавленной записи
+            Количество сообщений в очереди на запись
         """
-        query = '''
-            INSERT INTO conversation_history 
-            (user_id, username, user_first_name, role, message)
-            VALUES (?, ?, ?, ?, ?)
-        '''
-        return self.db_service.execute_update(
-            query, 
-            (user_id, username, user_first_name, role, message)
+        created_at = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Постановка в очередь и пополнение буфера под одной блокировкой,
+        # чтобы ленивая загрузка не задвоила и не потеряла сообщение
+        with self._buffers_lock:
+            with self._pending_ready:
+                self._pending.append((user_id, username, user_first_name, role, message, created_at))
+                queue_depth = len(self._pending)
+                if queue_depth >= config.HISTORY_FLUSH_BATCH_SIZE:
+                    self._pending_ready.notify()
+            
+            entry = self._buffers.get(user_id)
+            if entry is not None:
+                entry['messages'].append({'role': role, 'message': message, 'created_at': created_at})
+        
+        return queue_depth
+    
+    async def add_message_async(self, user_id: int, username: str, user_first_name: str,
+                                role: str, message: str) -> int:
+        """
+        Асинхронное добавление сообщения в историю (в отдельном потоке)
+        
+        Args:
+            user_id: Telegram ID пользователя
+            username: Username пользователя (может быть None)
+            user_first_name: Имя пользователя
+            role: 'user' или 'assistant'
+            message: Текст сообщения
+            
+        Returns:
+            Количество сообщений в очереди на запись
+        """
+        return await asyncio.to_thread(
+            self.add_message, user_id, username, user_first_name, role, message
         )
     
     def get_user_history(self, user_id: int, limit: int = 10) -> List[Dict]:
@@ -54,11 +220,20 @@ class ConversationService:
         Returns:
             Список сообщений в формате [{role, message, created_at}, ...]
         """
+        # Активные диалоги обслуживаются из памяти без запроса к БД
+        if limit <= self.buffer_size:
+            with self._buffers_lock:
+                messages = list(self._load_buffer(user_id))
+            return messages[-limit:] if limit > 0 else []
+        
+        # Длинная история читается из БД, поэтому сначала дописываем очередь
+        self.flush()
+        
         query = '''
             SELECT role, message, created_at
             FROM conversation_history
             WHERE user_id = ?
-            ORDER BY created_at DESC
+            ORDER BY created_at DESC, id DESC
             LIMIT ?
         '''
         rows = self.db_service.execute_query(query, (user_id, limit))
@@ -67,6 +242,64 @@ class ConversationService:
         messages = [dict(row) for row in reversed(rows)]
         return messages
     
+    def get_user_history_page(self, user_id: int, limit: int = 20, before: Tuple = None) -> Dict:
+        """
+        Постраничное получение истории диалога (keyset-пагинация вместо OFFSET)
+        
+        Курсор (created_at, id) совпадает с порядком индекса idx_history_user_created,
+        поэтому SQLite переходит к началу страницы поиском по индексу и читает
+        только limit строк, не просматривая более новые сообщения.
+        
+        Args:
+            user_id: Telegram ID пользователя
+            limit: Количество сообщений на странице
+            before: Курсор (created_at, id) из next_cursor предыдущей страницы (None — самые новые)
+            
+        Returns:
+            Словарь {messages: [{id, role, message, created_at}, ...] (старые первыми),
+                     next_cursor: (created_at, id) или None, если более старых сообщений нет}
+        """
+        self.flush()
+        
+        if before is None:
+            query = '''
+                SELECT id, role, message, created_at
+                FROM conversation_history
+                WHERE user_id = ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            '''
+            params = (user_id, limit)
+        else:
+            query = '''
+                SELECT id, role, message, created_at
+                FROM conversation_history
+                WHERE user_id = ? AND (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            '''
+            params = (user_id, before[0], before[1], limit)
+        
+        rows = self.db_service.execute_query(query, params)
+        
+        return {
+            'messages': [dict(row) for row in reversed(rows)],
+            'next_cursor': (rows[-1]['created_at'], rows[-1]['id']) if len(rows) == limit else None,
+        }
+    
+    async def get_user_history_async(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """
+        Асинхронное получение истории диалога (запрос в отдельном потоке)
+        
+        Args:
+            user_id: Telegram ID пользователя
+            limit: Максимальное количество последних сообщений
+            
+        Returns:
+            Список сообщений в формате [{role, message, created_at}, ...]
+        """
+        return await asyncio.to_thread(self.get_user_history, user_id, limit)
+    
     def get_conversation_context(self, user_id: int, max_messages: int = 6) -> str:
         """
         Формирование контекста диалога для AI
@@ -101,7 +334,12 @@ class ConversationService:
             Количество удалённых записей
         """
         query = "DELETE FROM conversation_history WHERE user_id = ?"
-        return self.db_service.execute_update(query, (user_id,))
+        
+        with self._buffers_lock:
+            self._buffers.pop(user_id, None)
+            # Иначе сообщения из очереди появятся в БД уже после удаления
+            self.flush()
+            return self.db_service.execute_update(query, (user_id,))
     
     def get_all_users(self) -> List[Dict]:
         """
@@ -121,6 +359,7 @@ class ConversationService:
             GROUP BY user_id
             ORDER BY last_message_at DESC
         '''
+        self.flush()
         rows = self.db_service.execute_query(query)
         return [dict(row) for row in rows]
     
@@ -144,5 +383,6 @@ class ConversationService:
             FROM conversation_history
             WHERE user_id = ?
         '''
+        self.flush()
         rows = self.db_service.execute_query(query, (user_id,))
         return dict(rows[0]) if rows else {}
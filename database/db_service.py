@@ -1,9 +1,15 @@
 """Сервис для работы с базой данных SQLite"""
 
 import sqlite3
+import queue
+import threading
 from contextlib import contextmanager
 from typing import List, Tuple, Any
 import pickle
+import sys
+sys.path.append('..')
+from database.embedding_codec import encode_embedding
+import config
 
 
 class DatabaseService:
@@ -17,18 +23,78 @@ class DatabaseService:
             db_path: Путь к файлу базы данных SQLite
         """
         self.db_path = db_path
+        self.fts_enabled = False  # Выставляется миграцией, если SQLite собран с FTS5
+        
+        # Долгоживущее соединение для записи: одно на процесс, доступ под блокировкой
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        
         self._init_database()
         self._migrate_database()  # ← НОВОЕ: Применение миграций
+        
+        # Пул соединений для чтения: в режиме WAL читатели не ждут писателя
+        self._readers = queue.Queue()
+        for _ in range(config.SQLITE_READER_POOL_SIZE):
+            self._readers.put(self._connect())
+    
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Открытие соединения с настройками производительности из config
+        
+        Returns:
+            Настроенное соединение SQLite
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False  # Соединения используются из потоков asyncio.to_thread
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode = {config.SQLITE_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous = {config.SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = {-int(config.SQLITE_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size = {int(config.SQLITE_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA temp_store = {config.SQLITE_TEMP_STORE}")
+        conn.execute(f"PRAGMA busy_timeout = {int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+        return conn
     
     @contextmanager
     def _get_connection(self):
-        """Контекстный менеджер для работы с подключением к БД"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Контекстный менеджер для работы с соединением на запись"""
+        with self._write_lock:
+            try:
+                yield self._writer
+            except Exception:
+                # Незафиксированная транзакция не должна остаться на общем соединении
+                self._writer.rollback()
+                raise
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Контекстный менеджер для транзакции на соединении записи
+        
+        Фиксирует изменения при успешном выходе и откатывает при исключении.
+        """
+        with self._get_connection() as conn:
+            yield conn
+            conn.commit()
+    
+    @contextmanager
+    def _get_reader(self):
+        """Контекстный менеджер для работы с соединением из пула чтения"""
+        conn = self._readers.get()
         try:
             yield conn
         finally:
-            conn.close()
+            self._readers.put(conn)
+    
+    def close(self):
+        """Закрытие всех соединений с БД"""
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        with self._write_lock:
+            self._writer.close()
     
     def _init_database(self):
         """Инициализация базы данных и создание таблиц"""
@@ -43,10 +109,25 @@ class DatabaseService:
                     topic VARCHAR(200) NOT NULL,
                     content TEXT NOT NULL,
                     embedding BLOB,
+                    embedding_dim INTEGER,
+                    embedding_model VARCHAR(200),
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
             
+            # Фрагменты записей знаний с собственными embeddings
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS knowledge_chunk (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    knowledge_id INTEGER NOT NULL REFERENCES knowledge(id) ON DELETE CASCADE,
+                    chunk_index INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    embedding BLOB,
+                    embedding_dim INTEGER,
+                    embedding_model VARCHAR(200)
+                )
+            ''')
+            
             # Создание таблицы истории диалогов
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS conversation_history (
@@ -72,8 +153,39 @@ class DatabaseService:
             ''')
             
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_user_id 
-                ON conversation_history(user_id)
+                CREATE INDEX IF NOT EXISTS idx_chunk_knowledge 
+                ON knowledge_chunk(knowledge_id, chunk_index)
+            ''')
+            
+            # Счётчик изменений фрагментов: по нему файл-спутник с embeddings
+            # определяет, что устарел (триггеры ловят и правки из других процессов)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS knowledge_meta (
+                    key VARCHAR(100) PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute("INSERT OR IGNORE INTO knowledge_meta (key, value) VALUES ('chunks_version', 0)")
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS knowledge_chunk_version_{event.lower()}
+                    AFTER {event} ON knowledge_chunk BEGIN
+                        UPDATE knowledge_meta SET value = value + 1 WHERE key = 'chunks_version';
+                    END
+                ''')
+            
+            # foreign_keys в SQLite выключены по умолчанию, фрагменты удаляет триггер
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS knowledge_chunk_delete AFTER DELETE ON knowledge BEGIN
+                    DELETE FROM knowledge_chunk WHERE knowledge_id = old.id;
+                END
+            ''')
+            
+            # Составной индекс: выборка истории пользователя по времени без сортировки,
+            # id в ключе нужен для keyset-пагинации
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_history_user_created 
+                ON conversation_history(user_id, created_at, id)
             ''')
             
             cursor.execute('''
@@ -100,6 +212,242 @@ class DatabaseService:
                 print("✅ Колонка embedding успешно добавлена")
             else:
                 print("Колонка embedding уже существует")
+            
+            # Заголовок формата embedding: размерность и модель
+            if 'embedding_dim' not in columns:
+                print("Применение миграции: добавление колонок embedding_dim и embedding_model...")
+                cursor.execute("ALTER TABLE knowledge ADD COLUMN embedding_dim INTEGER")
+                cursor.execute("ALTER TABLE knowledge ADD COLUMN embedding_model VARCHAR(200)")
+                conn.commit()
+                print("✅ Колонки embedding_dim и embedding_model успешно добавлены")
+            
+            # Индекс по одному user_id перекрыт составным idx_history_user_created
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'idx_user_id'")
+            if cursor.fetchone():
+                print("Применение миграции: удаление индекса idx_user_id (заменён составным)...")
+                cursor.execute("DROP INDEX idx_user_id")
+                cursor.execute("ANALYZE conversation_history")
+                conn.commit()
+                print("✅ Индекс idx_user_id удалён")
+            
+            self._migrate_pickled_embeddings(conn)
+            self._migrate_knowledge_fts(conn)
+            self._migrate_chunk_fts(conn)
+            self._migrate_auto_vacuum(conn)
+    
+    def _migrate_auto_vacuum(self, conn: sqlite3.Connection):
+        """
+        Перевод БД в режим auto_vacuum=INCREMENTAL для постепенного освобождения места
+        
+        Режим меняется только полной перезаписью файла (VACUUM), поэтому миграция
+        выполняется один раз; дальше место возвращает PRAGMA incremental_vacuum.
+        
+        Args:
+            conn: Открытое подключение к БД
+        """
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] == 2:
+            return
+        
+        print("Применение миграции: включение auto_vacuum=INCREMENTAL (однократный VACUUM)...")
+        conn.commit()
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+        print("✅ Инкрементальная очистка включена")
+    
+    def _migrate_knowledge_fts(self, conn: sqlite3.Connection):
+        """
+        Создание полнотекстового индекса FTS5 по темам и содержимому знаний
+        
+        Индекс хранит только токены (external content) и синхронизируется
+        с таблицей knowledge триггерами. Токенизатор unicode61 приводит
+        кириллицу к нижнему регистру, префиксные индексы ускоряют поиск по началу слова.
+        
+        Args:
+            conn: Открытое подключение к БД
+        """
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'knowledge_fts'")
+        exists = cursor.fetchone() is not None
+        
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_fts USING fts5(
+                    topic,
+                    content,
+                    content='knowledge',
+                    content_rowid='id',
+                    tokenize='unicode61',
+                    prefix='2 3'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ FTS5 недоступен, поиск будет работать через LIKE: {e}")
+            return
+        
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_fts_insert AFTER INSERT ON knowledge BEGIN
+                INSERT INTO knowledge_fts(rowid, topic, content)
+                VALUES (new.id, new.topic, new.content);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_fts_delete AFTER DELETE ON knowledge BEGIN
+                INSERT INTO knowledge_fts(knowledge_fts, rowid, topic, content)
+                VALUES ('delete', old.id, old.topic, old.content);
+            END
+        ''')
+        # Обновление embedding не затрагивает текст, поэтому реагируем только на topic и content
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_fts_update AFTER UPDATE OF topic, content ON knowledge BEGIN
+                INSERT INTO knowledge_fts(knowledge_fts, rowid, topic, content)
+                VALUES ('delete', old.id, old.topic, old.content);
+                INSERT INTO knowledge_fts(rowid, topic, content)
+                VALUES (new.id, new.topic, new.content);
+            END
+        ''')
+        
+        if not exists:
+            print("Применение миграции: построение полнотекстового индекса knowledge_fts...")
+            cursor.execute("INSERT INTO knowledge_fts(knowledge_fts) VALUES ('rebuild')")
+            print("✅ Полнотекстовый индекс построен")
+        
+        conn.commit()
+        self.fts_enabled = True
+    
+    def _migrate_chunk_fts(self, conn: sqlite3.Connection):
+        """
+        Создание полнотекстового индекса FTS5 по фрагментам записей знаний
+        
+        Лексический поиск для ИИ ранжирует по BM25 сразу фрагменты, а не записи
+        целиком, поэтому большие записи не приходится дочитывать в Python.
+        Тема записи повторяется в каждом фрагменте: совпадение с ней весит больше.
+        Таблица хранит собственную копию текста — триггеры удаляют строки по rowid,
+        не зная темы уже удалённой записи.
+        
+        Args:
+            conn: Открытое подключение к БД
+        """
+        if not self.fts_enabled:
+            return
+        
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'knowledge_chunk_fts'")
+        exists = cursor.fetchone() is not None
+        
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_chunk_fts USING fts5(
+                topic,
+                content,
+                tokenize='unicode61',
+                prefix='2 3'
+            )
+        ''')
+        
+        # Фрагмент вставляется после своей записи, тема берётся из неё
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_chunk_fts_insert AFTER INSERT ON knowledge_chunk BEGIN
+                INSERT INTO knowledge_chunk_fts(rowid, topic, content)
+                VALUES (new.id, (SELECT topic FROM knowledge WHERE id = new.knowledge_id), new.content);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_chunk_fts_delete AFTER DELETE ON knowledge_chunk BEGIN
+                DELETE FROM knowledge_chunk_fts WHERE rowid = old.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_chunk_fts_update AFTER UPDATE OF content ON knowledge_chunk BEGIN
+                UPDATE knowledge_chunk_fts SET content = new.content WHERE rowid = new.id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS knowledge_chunk_fts_topic AFTER UPDATE OF topic ON knowledge BEGIN
+                UPDATE knowledge_chunk_fts SET topic = new.topic
+                WHERE rowid IN (SELECT id FROM knowledge_chunk WHERE knowledge_id = new.id);
+            END
+        ''')
+        
+        if not exists:
+            print("Применение миграции: построение полнотекстового индекса фрагментов knowledge_chunk_fts...")
+            cursor.execute('''
+                INSERT INTO knowledge_chunk_fts(rowid, topic, content)
+                SELECT c.id, k.topic, c.content
+                FROM knowledge_chunk c
+                JOIN knowledge k ON k.id = c.knowledge_id
+            ''')
+            print("✅ Полнотекстовый индекс фрагментов построен")
+        
+        conn.commit()
+    
+    def _migrate_pickled_embeddings(self, conn: sqlite3.Connection):
+        """
+        Конвертация embeddings из pickle в сырой float32 по месту, пачками
+        
+        Строки без embedding_dim считаются записанными в старом формате.
+        Каждая пачка фиксируется отдельной транзакцией, поэтому прерванная
+        миграция продолжается со следующего запуска.
+        
+        Args:
+            conn: Открытое подключение к БД
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*) FROM knowledge WHERE embedding IS NOT NULL AND embedding_dim IS NULL"
+        )
+        total = cursor.fetchone()[0]
+        
+        if not total:
+            return
+        
+        print(f"Применение миграции: конвертация {total} embeddings из pickle в float32...")
+        
+        batch_size = config.EMBEDDING_MIGRATION_BATCH_SIZE
+        last_id = 0
+        converted = 0
+        dropped = 0
+        
+        while True:
+            cursor.execute('''
+                SELECT id, embedding FROM knowledge
+                WHERE embedding IS NOT NULL AND embedding_dim IS NULL AND id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (last_id, batch_size))
+            rows = cursor.fetchall()
+            
+            if not rows:
+                break
+            
+            updates = []
+            broken_ids = []
+            for row in rows:
+                try:
+                    embedding = pickle.loads(row['embedding'])
+                    blob = encode_embedding(embedding)
+                    updates.append((blob, len(blob) // 4, config.EMBEDDING_MODEL, row['id']))
+                except Exception as e:
+                    # Повреждённый embedding будет сгенерирован заново
+                    print(f"Не удалось конвертировать embedding записи {row['id']}: {e}")
+                    broken_ids.append((row['id'],))
+            
+            cursor.executemany(
+                "UPDATE knowledge SET embedding = ?, embedding_dim = ?, embedding_model = ? WHERE id = ?",
+                updates
+            )
+            cursor.executemany(
+                "UPDATE knowledge SET embedding = NULL WHERE id = ?",
+                broken_ids
+            )
+            conn.commit()
+            
+            converted += len(updates)
+            dropped += len(broken_ids)
+            last_id = rows[-1]['id']
+            print(f"  Конвертировано {converted + dropped}/{total}")
+        
+        print(f"✅ Конвертация embeddings завершена: {converted} успешно, {dropped} будут пересчитаны")
     
     def execute_query(self, query: str, params: Tuple = ()) -> List[sqlite3.Row]:
         """
@@ -112,7 +460,7 @@ class DatabaseService:
         Returns:
             Список строк результата
         """
-        with self._get_connection() as conn:
+        with self._get_reader() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             return cursor.fetchall()
@@ -126,10 +474,30 @@ class DatabaseService:
             params: Параметры запроса
             
         Returns:
-            ID последней вставленной записи или количество затронутых строк
+            Для INSERT/REPLACE — ID вставленной записи, иначе — количество затронутых строк
         """
         with self._get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute(query, params)
             conn.commit()
-            return cursor.lastrowid if cursor.lastrowid else cursor.rowcount
+            # lastrowid общего соединения записи хранит ID прошлых INSERT и для UPDATE/DELETE
+            if query.lstrip().upper().startswith(('INSERT', 'REPLACE')):
+                return cursor.lastrowid
+            return cursor.rowcount
+    
+    def execute_many(self, query: str, params_list: List[Tuple]) -> int:
+        """
+        Выполнение INSERT/UPDATE/DELETE запроса для набора параметров в одной транзакции
+        
+        Args:
+            query: SQL запрос
+            params_list: Список наборов параметров
+            
+        Returns:
+            Количество затронутых строк
+        """
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(query, params_list)
+            conn.commit()
+            return cursor.rowcount
@@ -0,0 +1,79 @@
+"""Компактный формат хранения embeddings в БД"""
+
+import numpy as np
+
+# Фиксированный формат: сырые байты float32 little-endian без заголовка внутри BLOB.
+# Размерность и модель хранятся в отдельных колонках embedding_dim и embedding_model.
+EMBEDDING_DTYPE = np.dtype('<f4')
+
+
+def encode_embedding(embedding) -> bytes:
+    """
+    Сериализация embedding в сырые байты float32 little-endian
+    
+    Args:
+        embedding: Вектор embedding (ndarray или список чисел)
+        
+    Returns:
+        Байты для записи в колонку embedding
+    """
+    return np.asarray(embedding, dtype=EMBEDDING_DTYPE).ravel().tobytes()
+
+
+def decode_embedding(blob: bytes, dim: int = None) -> np.ndarray:
+    """
+    Десериализация embedding из БД без копирования данных
+    
+    Args:
+        blob: Байты из колонки embedding
+        dim: Ожидаемая размерность из колонки embedding_dim (опционально)
+        
+    Returns:
+        Вектор float32 (только для чтения, указывает на память blob)
+    """
+    vector = np.frombuffer(blob, dtype=EMBEDDING_DTYPE)
+    if dim is not None and vector.shape[0] != dim:
+        raise ValueError(f"Размерность embedding {vector.shape[0]} не совпадает с заголовком {dim}")
+    return vector
+
+
+def quantize_embeddings(vectors: np.ndarray, dtype: str) -> tuple:
+    """
+    Сжатие нормализованных embeddings для резидентного индекса
+    
+    int8 кодируется с отдельным масштабом на вектор: code = round(x / scale),
+    где scale = max|x| / 127.
+    
+    Args:
+        vectors: Матрица float32 (N x dim)
+        dtype: 'float32', 'float16' или 'int8'
+        
+    Returns:
+        Кортеж (codes, scales); scales равен None для float32 и float16
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dtype == 'float32':
+        return vectors, None
+    if dtype == 'float16':
+        return vectors.astype(np.float16), None
+    if dtype == 'int8':
+        scales = np.abs(vectors).max(axis=1) / 127 if vectors.size else np.empty(0, dtype=np.float32)
+        scales = np.where(scales > 0, scales, 1).astype(np.float32)
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales
+    raise ValueError(f"Неизвестный тип индекса embeddings: {dtype}")
+
+
+def dequantize_embeddings(codes: np.ndarray, scales: np.ndarray = None) -> np.ndarray:
+    """
+    Восстановление приближённых float32 векторов из кодов индекса
+    
+    Args:
+        codes: Матрица кодов (float32, float16 или int8)
+        scales: Масштабы векторов для int8
+        
+    Returns:
+        Матрица float32
+    """
+    vectors = np.asarray(codes, dtype=np.float32)
+    return vectors * scales[:, None] if scales is not None else vectors
@@ -0,0 +1,138 @@
+"""Файл-спутник БД с матрицей embeddings для мгновенного холодного старта"""
+
+import hashlib
+import json
+import os
+from typing import Optional, Tuple
+import numpy as np
+
+# Версия формата файлов; при изменении раскладки старые файлы перестраиваются
+SIDECAR_FORMAT = 2
+
+
+class EmbeddingSidecar:
+    """Класс для хранения индекса embeddings (коды и масштабы) в .npy рядом с БД с открытием через mmap"""
+    
+    def __init__(self, base_path: str):
+        """
+        Инициализация файла-спутника
+        
+        Args:
+            base_path: Префикс путей (например, "knowledge_base.db.embeddings")
+        """
+        self.matrix_path = f"{base_path}.npy"
+        self.ids_path = f"{base_path}.ids.npy"
+        self.scales_path = f"{base_path}.scales.npy"
+        self.meta_path = f"{base_path}.json"
+    
+    @staticmethod
+    def _checksum(ids: np.ndarray, matrix_shape: tuple, dtype: str, model_name: str) -> str:
+        """
+        Контрольная сумма содержимого: ID фрагментов, форма и тип матрицы, модель
+        
+        Матрица по содержимому не хэшируется, иначе открытие прочитало бы весь файл;
+        её целостность проверяет np.load по заголовку и размеру файла.
+        
+        Args:
+            ids: Массив ID (2 x N: фрагменты и записи)
+            matrix_shape: Форма матрицы embeddings
+            dtype: Тип кодов матрицы
+            model_name: Название модели embeddings
+        
+        Returns:
+            Шестнадцатеричная строка sha256
+        """
+        digest = hashlib.sha256()
+        digest.update(np.ascontiguousarray(ids, dtype='<i8').tobytes())
+        digest.update(repr(tuple(matrix_shape)).encode())
+        digest.update(dtype.encode())
+        digest.update(model_name.encode())
+        return digest.hexdigest()
+    
+    def load(self, version: int, model_name: str, dtype: str) -> Optional[Tuple]:
+        """
+        Открытие индекса, если он соответствует текущему состоянию БД
+        
+        Args:
+            version: Текущий счётчик изменений фрагментов в БД
+            model_name: Текущая модель embeddings
+            dtype: Ожидаемый тип кодов ('float32', 'float16' или 'int8')
+        
+        Returns:
+            Кортеж (chunk_ids, knowledge_ids, matrix, scales) с матрицей в режиме mmap
+            (scales — None для float-режимов) или None, если файлов нет или они устарели
+        """
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        
+        if meta.get('format') != SIDECAR_FORMAT:
+            print("Файл embeddings устарел: другой формат")
+            return None
+        if meta.get('version') != version or meta.get('model') != model_name:
+            print(f"Файл embeddings устарел: версия {meta.get('version')}, в БД {version}")
+            return None
+        if meta.get('dtype') != dtype:
+            print(f"Файл embeddings в другом формате: {meta.get('dtype')}, нужен {dtype}")
+            return None
+        
+        try:
+            ids = np.load(self.ids_path)
+            matrix = np.load(self.matrix_path, mmap_mode='r')
+            scales = np.load(self.scales_path) if dtype == 'int8' else None
+        except (OSError, ValueError) as e:
+            print(f"Не удалось открыть файл embeddings: {e}")
+            return None
+        
+        if (matrix.dtype != np.dtype(dtype)
+                or meta.get('checksum') != self._checksum(ids, matrix.shape, dtype, model_name)
+                or (scales is not None and len(scales) != matrix.shape[0])):
+            print("Файл embeddings повреждён: контрольная сумма не совпадает")
+            return None
+        
+        return ids[0], ids[1], matrix, scales
+    
+    def save(self, chunk_ids: np.ndarray, knowledge_ids: np.ndarray, matrix: np.ndarray,
+             scales: Optional[np.ndarray], version: int, model_name: str):
+        """
+        Запись индекса: сначала данные во временные файлы, метаданные последними
+        
+        Прерванная запись оставляет старые метаданные с неподходящей
+        контрольной суммой, и при следующем старте индекс перестраивается.
+        
+        Args:
+            chunk_ids: ID фрагментов
+            knowledge_ids: ID записей в том же порядке
+            matrix: Коды нормализованных embeddings в том же порядке
+            scales: Масштабы векторов для int8 (None для float-режимов)
+            version: Счётчик изменений фрагментов в БД, которому соответствует индекс
+            model_name: Модель embeddings
+        """
+        ids = np.vstack([chunk_ids, knowledge_ids]).astype('<i8')
+        matrix = np.ascontiguousarray(matrix)
+        dtype = matrix.dtype.name
+        meta = {
+            'format': SIDECAR_FORMAT,
+            'version': version,
+            'model': model_name,
+            'dtype': dtype,
+            'count': int(ids.shape[1]),
+            'checksum': self._checksum(ids, matrix.shape, dtype, model_name),
+        }
+        
+        arrays = [(self.ids_path, ids), (self.matrix_path, matrix)]
+        if scales is not None:
+            arrays.append((self.scales_path, np.asarray(scales, dtype=np.float32)))
+        
+        for path, array in arrays:
+            # np.save добавляет .npy к имени без этого расширения
+            tmp_path = f"{path[:-len('.npy')]}.tmp.npy"
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+        
+        tmp_meta_path = f"{self.meta_path}.tmp"
+        with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_meta_path, self.meta_path)
@@ -1,36 +1,472 @@
 """Сервис для работы с базой знаний"""
 
-from typing import List, Dict
+from typing import Callable, List, Dict
+import asyncio
+import re
 import sys
+import threading
+import time
+from concurrent.futures import Future
 sys.path.append('..')
 from database.db_service import DatabaseService
-import pickle
+from database.embedding_codec import (
+    encode_embedding, decode_embedding, quantize_embeddings, dequantize_embeddings
+)
+from database.embedding_sidecar import EmbeddingSidecar
+from services.embedding_worker import EmbeddingWorker
+from services.embedding_cache import EmbeddingCache
+from services.text_chunker import split_into_passages
+from services.ann_index import AnnIndex
+from services.embedding_backends import load_embedding_model
 import numpy as np
-from sentence_transformers import SentenceTransformer
+import config
 
 
 class KnowledgeService:
     """Класс для управления базой знаний"""
     
+    # Строк матрицы за один шаг перебора сжатого индекса
+    _SCAN_BLOCK_ROWS = 16384
+    
     def __init__(self, db_service: DatabaseService):
         """
         Инициализация сервиса базы знаний
         
+        Модель, заполнение базы и индекс загружаются в start_warm_up() в фоновом потоке;
+        методы, которым они нужны, ждут готовности через future ready.
+        
         Args:
             db_service: Сервис базы данных
         """
         self.db_service = db_service
+        self.model_name = config.EMBEDDING_MODEL
+        
+        # Заполняются при прогреве
+        self.model = None
+        self.embedder = None
+        
+        # Готовность модели и индекса; исключение прогрева получат ожидающие
+        self.ready = Future()
+        self.warm_up_timings = {}
+        self._warm_up_thread = None
+        self._warm_up_lock = threading.Lock()
+        
+        # Подписчики на изменения записей (например, кэш ответов AI)
+        self._change_listeners = []
+        
+        # Повторяющиеся вопросы не кодируются заново
+        self.query_cache = EmbeddingCache(
+            max_size=config.QUERY_EMBEDDING_CACHE_SIZE,
+            ttl_seconds=config.QUERY_EMBEDDING_CACHE_TTL
+        )
+        
+        # Резидентный индекс фрагментов: матрица кодов нормализованных embeddings
+        # (float32, float16 или int8 с масштабом на вектор — EMBEDDING_INDEX_DTYPE)
+        # и параллельные массивы ID фрагментов и ID записей.
+        # Кортеж (chunk_ids, knowledge_ids, matrix, scales) заменяется целиком,
+        # поэтому поиск читает его без блокировки; scales — None для float-режимов
+        self.index_dtype = config.EMBEDDING_INDEX_DTYPE
+        self._index_lock = threading.Lock()
+        self._index = (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.int64),
+            *quantize_embeddings(np.empty((0, 0), dtype=np.float32), self.index_dtype)
+        )
+        
+        # Приближённый индекс для больших баз (опционально, при установленном hnswlib)
+        self.ann_index = None
+        
+        # Файл-спутник с матрицей для старта без чтения embeddings из SQLite.
+        # _index_version — значение счётчика chunks_version в БД, которому соответствует индекс
+        # (None, если неизвестно из-за правок других процессов — тогда файл не сохраняется)
+        self.sidecar = None
+        if config.EMBEDDING_SIDECAR_ENABLED:
+            self.sidecar = EmbeddingSidecar(f"{db_service.db_path}.embeddings")
+        self._index_version = None
+        self._sidecar_dirty = False
+    
+    def start_warm_up(self):
+        """Запуск прогрева в фоновом потоке (повторные вызовы ничего не делают)"""
+        with self._warm_up_lock:
+            if self._warm_up_thread is not None:
+                return
+            self._warm_up_thread = threading.Thread(
+                target=self._warm_up, name="knowledge-warm-up", daemon=True
+            )
+            self._warm_up_thread.start()
+    
+    def _warm_up(self):
+        """Загрузка модели, заполнение базы, генерация embeddings и построение индекса"""
+        if not self.ready.set_running_or_notify_cancel():
+            return
+        
+        try:
+            started_at = time.perf_counter()
+            
+            # Тяжёлые импорты (torch, onnxruntime) — только здесь, а не при импорте модуля
+            print(f"Загрузка модели для семантического поиска ({config.EMBEDDING_BACKEND})...")
+            self.model = self._load_model()
+            self.warm_up_timings['model_load'] = time.perf_counter() - started_at
+            print(f"Модель загружена успешно за {self.warm_up_timings['model_load']:.1f} с")
+            
+            # Кодирование одиночных текстов вне event loop с объединением в пачки
+            self.embedder = EmbeddingWorker(
+                self.model,
+                batch_window_ms=config.EMBEDDING_BATCH_WINDOW_MS,
+                max_batch_size=config.EMBEDDING_MAX_BATCH_SIZE
+            )
+            
+            # Проверка и заполнение базы знаний
+            stage_started_at = time.perf_counter()
+            self._populate_initial_knowledge()
+            
+            # Разбиение на фрагменты и генерация embeddings для записей без них
+            self._generate_missing_embeddings()
+            self.warm_up_timings['embeddings_backfill'] = time.perf_counter() - stage_started_at
+            
+            # Построение индекса один раз при старте
+            stage_started_at = time.perf_counter()
+            self._build_embedding_index()
+            self._init_ann_index()
+            self.warm_up_timings['index_build'] = time.perf_counter() - stage_started_at
+            
+            self.warm_up_timings['total'] = time.perf_counter() - started_at
+            print(f"База знаний готова к поиску за {self.warm_up_timings['total']:.1f} с")
+            self.ready.set_result(True)
+        except Exception as e:
+            print(f"Ошибка прогрева базы знаний: {e}")
+            self.ready.set_exception(e)
+    
+    def _load_model(self):
+        """
+        Загрузка модели на бэкенде из конфига с проверкой совместимости векторов
+        
+        Если бэкенд не загрузился или его векторы расходятся с сохранёнными
+        сильнее EMBEDDING_BACKEND_MIN_AGREEMENT, используется PyTorch.
+        
+        Returns:
+            Модель embeddings
+        """
+        threads = config.EMBEDDING_INTRA_OP_THREADS
+        
+        if config.EMBEDDING_BACKEND != 'torch':
+            try:
+                model = load_embedding_model(
+                    self.model_name,
+                    config.EMBEDDING_BACKEND,
+                    threads,
+                    config.EMBEDDING_ONNX_QUANTIZATION
+                )
+                agreement = self._measure_agreement(model)
+                if agreement >= config.EMBEDDING_BACKEND_MIN_AGREEMENT:
+                    print(f"Бэкенд {config.EMBEDDING_BACKEND}: совпадение с сохранёнными векторами {agreement:.4f}")
+                    return model
+                print(f"⚠️ Векторы бэкенда {config.EMBEDDING_BACKEND} расходятся с сохранёнными "
+                      f"({agreement:.4f}), используется torch")
+            except Exception as e:
+                print(f"⚠️ Не удалось загрузить бэкенд {config.EMBEDDING_BACKEND}, используется torch: {e}")
+        
+        return load_embedding_model(self.model_name, 'torch', threads)
+    
+    def _measure_agreement(self, model, sample_size: int = 8) -> float:
+        """
+        Среднее косинусное сходство векторов модели с сохранёнными в БД
+        
+        Args:
+            model: Проверяемая модель
+            sample_size: Сколько фрагментов перекодировать
+            
+        Returns:
+            Среднее сходство (1.0, если сравнивать не с чем)
+        """
+        rows = self.db_service.execute_query('''
+            SELECT k.topic, c.content, c.embedding, c.embedding_dim
+            FROM knowledge_chunk c
+            JOIN knowledge k ON k.id = c.knowledge_id
+            WHERE c.embedding IS NOT NULL AND c.embedding_model = ?
+            ORDER BY c.id
+            LIMIT ?
+        ''', (self.model_name, sample_size))
+        
+        if not rows:
+            return 1.0
+        
+        texts = [self._chunk_embedding_text(row['topic'], row['content']) for row in rows]
+        vectors = model.encode(texts, batch_size=len(texts))
+        similarities = [
+            float(self._normalize(vector) @ self._normalize(decode_embedding(row['embedding'], row['embedding_dim'])))
+            for row, vector in zip(rows, vectors)
+        ]
+        return sum(similarities) / len(similarities)
+    
+    def wait_ready(self):
+        """Блокирующее ожидание готовности модели и индекса (запускает прогрев, если он не начат)"""
+        if not self.ready.done():
+            self.start_warm_up()
+        self.ready.result()
+    
+    async def wait_ready_async(self):
+        """Ожидание готовности модели и индекса без блокировки event loop"""
+        if not self.ready.done():
+            self.start_warm_up()
+            await asyncio.wrap_future(self.ready)
+        self.ready.result()
+    
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        """
+        Приведение embedding к float32 и единичной норме
+        
+        Args:
+            embedding: Вектор embedding
+            
+        Returns:
+            Нормализованный вектор float32
+        """
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def _get_chunks_version(self, conn=None) -> int:
+        """
+        Текущее значение счётчика изменений фрагментов
+        
+        Args:
+            conn: Соединение с открытой транзакцией (по умолчанию — из пула чтения)
+            
+        Returns:
+            Значение chunks_version
+        """
+        query = "SELECT value FROM knowledge_meta WHERE key = 'chunks_version'"
+        rows = conn.execute(query).fetchall() if conn else self.db_service.execute_query(query)
+        return rows[0][0] if rows else 0
+    
+    def _advance_index_version(self, before: int, after: int):
+        """
+        Учёт собственной записи фрагментов в версии индекса
+        
+        Args:
+            before: Счётчик в начале транзакции записи
+            after: Счётчик в конце транзакции записи
+        """
+        self._index_version = after if self._index_version == before else None
+        self._sidecar_dirty = True
+    
+    def _save_sidecar(self):
+        """Сохранение индекса в файл-спутник, если известна версия БД, которой он соответствует"""
+        if not self.sidecar or self._index_version is None:
+            return
+        
+        chunk_ids, knowledge_ids, matrix, scales = self._index
+        if not matrix.size:
+            return
+        
+        try:
+            self.sidecar.save(chunk_ids, knowledge_ids, matrix, scales, self._index_version, self.model_name)
+            self._sidecar_dirty = False
+        except Exception as e:
+            print(f"Не удалось сохранить файл embeddings: {e}")
+    
+    def _build_embedding_index(self):
+        """
+        Построение резидентной матрицы embeddings фрагментов (один раз при старте)
+        
+        Актуальный файл-спутник открывается через mmap без чтения embeddings из SQLite,
+        иначе матрица собирается из БД и файл перезаписывается.
+        """
+        version = self._get_chunks_version()
+        
+        if self.sidecar:
+            loaded = self.sidecar.load(version, self.model_name, self.index_dtype)
+            if loaded:
+                with self._index_lock:
+                    self._index = loaded
+                self._index_version = version
+                print(f"Индекс embeddings открыт из файла: {len(loaded[0])} фрагментов")
+                return
+        
+        rows = self.db_service.execute_query('''
+            SELECT id, knowledge_id, embedding, embedding_dim FROM knowledge_chunk
+            WHERE embedding IS NOT NULL AND embedding_model = ?
+            ORDER BY id
+        ''', (self.model_name,))
         
-        # Инициализация модели для embeddings
-        print("Загрузка модели для семантического поиска...")
-        self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-        print("Модель загружена успешно")
+        chunk_ids = np.fromiter((row['id'] for row in rows), dtype=np.int64, count=len(rows))
+        knowledge_ids = np.fromiter((row['knowledge_id'] for row in rows), dtype=np.int64, count=len(rows))
+        vectors = [
+            self._normalize(decode_embedding(row['embedding'], row['embedding_dim']))
+            for row in rows
+        ]
+        matrix = np.vstack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        matrix, scales = quantize_embeddings(matrix, self.index_dtype)
+        
+        with self._index_lock:
+            self._index = (chunk_ids, knowledge_ids, matrix, scales)
+        self._index_version = version
+        
+        print(f"Индекс embeddings построен: {len(chunk_ids)} фрагментов, "
+              f"{len(np.unique(knowledge_ids))} записей, {self.index_dtype}, "
+              f"{(matrix.nbytes + (scales.nbytes if scales is not None else 0)) / 2**20:.1f} МБ")
+        
+        self._save_sidecar()
+    
+    def _init_ann_index(self):
+        """Загрузка или построение ANN-индекса по резидентной матрице, если он включён"""
+        if not config.ANN_INDEX_ENABLED:
+            return
+        if not AnnIndex.is_available():
+            print("⚠️ ANN-индекс включён, но hnswlib не установлен — используется точный поиск")
+            return
+        
+        chunk_ids, _, matrix, scales = self._index
+        dim = matrix.shape[1] if matrix.size else self.model.get_sentence_embedding_dimension()
+        
+        # Как и файл embeddings, индекс по умолчанию лежит рядом с БД
+        self.ann_index = AnnIndex(
+            config.ANN_INDEX_PATH or f"{self.db_service.db_path}.ann.hnsw",
+            dim,
+            model_name=self.model_name,
+            dtype=self.index_dtype,
+            m=config.ANN_M,
+            ef_construction=config.ANN_EF_CONSTRUCTION,
+            ef_search=config.ANN_EF_SEARCH
+        )
+        # В сжатых режимах граф строится по восстановленным из кодов векторам
+        if self.index_dtype != 'float32':
+            matrix = dequantize_embeddings(matrix, scales)
+        self.ann_index.load_or_build(chunk_ids, matrix)
+    
+    def _index_replace(self, knowledge_id: int, chunk_ids: List[int], embeddings: List):
+        """
+        Замена всех фрагментов записи в резидентном индексе
+        
+        Args:
+            knowledge_id: ID записи
+            chunk_ids: ID новых фрагментов записи
+            embeddings: Embeddings новых фрагментов в том же порядке
+        """
+        vectors = np.vstack([self._normalize(embedding) for embedding in embeddings])
+        codes, new_scales = quantize_embeddings(vectors, self.index_dtype)
+        new_chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        new_knowledge_ids = np.full(len(chunk_ids), knowledge_id, dtype=np.int64)
         
-        # Проверка и заполнение базы знаний
-        self._populate_initial_knowledge()
+        with self._index_lock:
+            index_chunk_ids, index_knowledge_ids, matrix, scales = self._index
+            old_chunk_ids = index_chunk_ids[index_knowledge_ids == knowledge_id]
+            
+            if self.ann_index:
+                self.ann_index.remove(old_chunk_ids)
+                self.ann_index.add(new_chunk_ids, vectors)
+            
+            if matrix.size:
+                # Новые массивы, чтобы не менять данные под уже идущим поиском
+                keep = index_knowledge_ids != knowledge_id
+                new_chunk_ids = np.concatenate([index_chunk_ids[keep], new_chunk_ids])
+                new_knowledge_ids = np.concatenate([index_knowledge_ids[keep], new_knowledge_ids])
+                codes = np.vstack([matrix[keep], codes])
+                if scales is not None:
+                    new_scales = np.concatenate([scales[keep], new_scales])
+            
+            self._index = (new_chunk_ids, new_knowledge_ids, codes, new_scales)
+    
+    def _index_remove(self, knowledge_id: int):
+        """
+        Удаление фрагментов записи из резидентного индекса
         
-        # Генерация embeddings для существующих записей без них
-        self._generate_missing_embeddings()
+        Args:
+            knowledge_id: ID удаляемой записи
+        """
+        with self._index_lock:
+            chunk_ids, knowledge_ids, matrix, scales = self._index
+            keep = knowledge_ids != knowledge_id
+            if keep.all():
+                return
+            if self.ann_index:
+                self.ann_index.remove(chunk_ids[~keep])
+            self._index = (
+                chunk_ids[keep],
+                knowledge_ids[keep],
+                matrix[keep],
+                scales[keep] if scales is not None else None
+            )
+    
+    @staticmethod
+    def _chunk_embedding_text(topic: str, passage: str) -> str:
+        """
+        Текст для кодирования фрагмента: тема даёт контекст фрагментам из середины записи
+        
+        Args:
+            topic: Тема записи
+            passage: Текст фрагмента
+            
+        Returns:
+            Текст для модели embeddings
+        """
+        return f"{topic}\n{passage}"
+    
+    @staticmethod
+    def _split_content(content: str) -> List[str]:
+        """
+        Разбиение содержимого записи на перекрывающиеся фрагменты
+        
+        Args:
+            content: Содержимое записи
+            
+        Returns:
+            Список фрагментов (не пустой для непустого содержимого)
+        """
+        return split_into_passages(content, config.KNOWLEDGE_CHUNK_SIZE, config.KNOWLEDGE_CHUNK_OVERLAP)
+    
+    def _write_chunks(self, conn, knowledge_id: int, passages: List[str], embeddings: List) -> List[int]:
+        """
+        Замена фрагментов записи в БД в рамках уже открытой транзакции
+        
+        Args:
+            conn: Соединение с открытой транзакцией
+            knowledge_id: ID записи
+            passages: Тексты фрагментов
+            embeddings: Embeddings фрагментов
+            
+        Returns:
+            ID вставленных фрагментов
+        """
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM knowledge_chunk WHERE knowledge_id = ?", (knowledge_id,))
+        
+        chunk_ids = []
+        for chunk_index, (passage, embedding) in enumerate(zip(passages, embeddings)):
+            cursor.execute('''
+                INSERT INTO knowledge_chunk
+                    (knowledge_id, chunk_index, content, embedding, embedding_dim, embedding_model)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (knowledge_id, chunk_index, passage, encode_embedding(embedding),
+                  len(embedding), self.model_name))
+            chunk_ids.append(cursor.lastrowid)
+        
+        return chunk_ids
+    
+    def add_change_listener(self, listener: Callable[[int, str], None]):
+        """
+        Подписка на изменения базы знаний
+        
+        Args:
+            listener: Функция listener(knowledge_id, action), где action — 'add', 'update' или 'delete'
+        """
+        self._change_listeners.append(listener)
+    
+    def _notify_change(self, knowledge_id: int, action: str):
+        """
+        Уведомление подписчиков об изменении записи
+        
+        Args:
+            knowledge_id: ID изменённой записи
+            action: 'add', 'update' или 'delete'
+        """
+        for listener in self._change_listeners:
+            try:
+                listener(knowledge_id, action)
+            except Exception as e:
+                print(f"Ошибка в обработчике изменения базы знаний: {e}")
     
     def _populate_initial_knowledge(self):
         """Заполнение базы начальными знаниями о Битрикс24"""
@@ -84,38 +520,91 @@ class KnowledgeService:
         ]
         
         for item in initial_knowledge:
-            self.add_knowledge(item["category"], item["topic"], item["content"])
+            self._add_knowledge(item["category"], item["topic"], item["content"])
         
         print("База знаний о Битрикс24 успешно заполнена")
     
     def _generate_missing_embeddings(self):
-        """Генерация embeddings для записей без них"""
-        query = "SELECT id, content FROM knowledge WHERE embedding IS NULL"
-        rows = self.db_service.execute_query(query)
+        """
+        Разбиение на фрагменты и генерация embeddings для записей без фрагментов
+        или с фрагментами, закодированными другой моделью
         
-        if not rows:
+        Записи обрабатываются пачками по EMBEDDING_BACKFILL_BATCH_SIZE, фрагменты
+        пачки кодируются одним вызовом модели и сохраняются одной транзакцией.
+        Обработанные записи выпадают из выборки, поэтому прерванная генерация
+        продолжается с места остановки при следующем запуске. Устаревший embedding
+        всей записи при этом очищается.
+        """
+        pending_condition = '''(
+            NOT EXISTS (SELECT 1 FROM knowledge_chunk c
+                        WHERE c.knowledge_id = k.id AND c.embedding_model = ?)
+            OR EXISTS (SELECT 1 FROM knowledge_chunk c
+                       WHERE c.knowledge_id = k.id AND c.embedding_model IS NOT ?)
+        )'''
+        
+        rows = self.db_service.execute_query(
+            f"SELECT COUNT(*) AS total FROM knowledge k WHERE {pending_condition}",
+            (self.model_name, self.model_name)
+        )
+        total = rows[0]['total'] if rows else 0
+        
+        if not total:
             print("Все записи уже имеют embeddings")
             return
         
-        print(f"Генерация embeddings для {len(rows)} записей...")
+        print(f"Генерация embeddings для {total} записей...")
         
-        for row in rows:
-            knowledge_id = row['id']
-            content = row['content']
+        batch_size = config.EMBEDDING_BACKFILL_BATCH_SIZE
+        select_query = f'''
+            SELECT k.id, k.topic, k.content FROM knowledge k
+            WHERE {pending_condition} AND k.id > ?
+            ORDER BY k.id
+            LIMIT ?
+        '''
+        
+        processed = 0
+        last_id = 0
+        started_at = time.perf_counter()
+        
+        while True:
+            rows = self.db_service.execute_query(
+                select_query, (self.model_name, self.model_name, last_id, batch_size)
+            )
+            if not rows:
+                break
             
-            # Генерируем embedding
-            embedding = self.model.encode(content)
-            embedding_blob = pickle.dumps(embedding)
+            passages_by_row = [self._split_content(row['content']) for row in rows]
+            texts = [
+                self._chunk_embedding_text(row['topic'], passage)
+                for row, passages in zip(rows, passages_by_row)
+                for passage in passages
+            ]
             
-            # Сохраняем в БД
-            update_query = "UPDATE knowledge SET embedding = ? WHERE id = ?"
-            self.db_service.execute_update(update_query, (embedding_blob, knowledge_id))
+            # Одна пачка — один вызов модели
+            embeddings = self.model.encode(texts, batch_size=batch_size)
+            
+            with self.db_service.transaction() as conn:
+                offset = 0
+                for row, passages in zip(rows, passages_by_row):
+                    self._write_chunks(conn, row['id'], passages, embeddings[offset:offset + len(passages)])
+                    offset += len(passages)
+                conn.executemany(
+                    "UPDATE knowledge SET embedding = NULL, embedding_dim = NULL, embedding_model = NULL WHERE id = ?",
+                    [(row['id'],) for row in rows]
+                )
+            
+            processed += len(rows)
+            last_id = rows[-1]['id']
+            elapsed = time.perf_counter() - started_at
+            rate = processed / elapsed if elapsed > 0 else 0.0
+            print(f"  Embeddings: {processed}/{total} ({rate:.1f} записей/с)")
         
-        print(f"Embeddings успешно сгенерированы для {len(rows)} записей")
+        elapsed = time.perf_counter() - started_at
+        print(f"Embeddings фрагментов успешно сгенерированы для {processed} записей за {elapsed:.1f} с")
     
     def add_knowledge(self, category: str, topic: str, content: str) -> int:
         """
-        Добавление нового знания в базу с автоматической генерацией embedding
+        Добавление нового знания в базу с разбиением на фрагменты и генерацией их embeddings
         
         Args:
             category: Категория знания
@@ -125,15 +614,43 @@ class KnowledgeService:
         Returns:
             ID добавленной записи
         """
-        # Генерируем embedding
-        embedding = self.model.encode(content)
-        embedding_blob = pickle.dumps(embedding)
+        self.wait_ready()
+        return self._add_knowledge(category, topic, content)
+    
+    def _add_knowledge(self, category: str, topic: str, content: str) -> int:
+        """
+        Добавление знания без ожидания готовности (используется и при прогреве)
         
-        query = '''
-            INSERT INTO knowledge (category, topic, content, embedding)
-            VALUES (?, ?, ?, ?)
-        '''
-        return self.db_service.execute_update(query, (category, topic, content, embedding_blob))
+        Args:
+            category: Категория знания
+            topic: Тема знания
+            content: Содержимое знания
+            
+        Returns:
+            ID добавленной записи
+        """
+        # Генерируем embeddings фрагментов
+        passages = self._split_content(content)
+        embeddings = self.embedder.encode_many(
+            [self._chunk_embedding_text(topic, passage) for passage in passages]
+        )
+        
+        with self.db_service.transaction() as conn:
+            version_before = self._get_chunks_version(conn)
+            cursor = conn.execute(
+                "INSERT INTO knowledge (category, topic, content) VALUES (?, ?, ?)",
+                (category, topic, content)
+            )
+            knowledge_id = cursor.lastrowid
+            chunk_ids = self._write_chunks(conn, knowledge_id, passages, embeddings)
+            self._advance_index_version(version_before, self._get_chunks_version(conn))
+        
+        if knowledge_id:
+            if chunk_ids:
+                self._index_replace(knowledge_id, chunk_ids, embeddings)
+            self._notify_change(knowledge_id, 'add')
+        
+        return knowledge_id
     
     def get_all_knowledge(self) -> List[Dict]:
         """
@@ -150,26 +667,94 @@ class KnowledgeService:
         rows = self.db_service.execute_query(query)
         return [dict(row) for row in rows]
     
-    def search_knowledge(self, search_term: str) -> List[Dict]:
+    @staticmethod
+    def _build_fts_query(search_term: str, match_any: bool = False) -> str:
+        """
+        Преобразование пользовательского ввода в безопасный запрос FTS5
+        
+        Каждый токен берётся в кавычки (спецсимволы FTS5 не интерпретируются)
+        и ищется по префиксу. Токены вида crm.deal.add сохраняются целиком
+        и ищутся как фраза.
+        
+        Args:
+            search_term: Строка поиска
+            match_any: True — достаточно любого слова (OR), False — нужны все (AND)
+            
+        Returns:
+            Запрос для MATCH или пустая строка, если слов нет
+        """
+        terms = re.findall(r'\w+(?:[.\-]\w+)*', search_term.lower())
+        operator = " OR " if match_any else " "
+        return operator.join(f'"{term}"*' for term in terms)
+    
+    def search_knowledge(self, search_term: str, limit: int = 50, offset: int = 0) -> List[Dict]:
         """
-        Поиск знаний по ключевому слову
+        Поиск знаний по ключевым словам с ранжированием BM25
         
         Args:
             search_term: Ключевое слово для поиска
+            limit: Максимальное количество результатов на странице
+            offset: Смещение от начала списка результатов
             
         Returns:
-            Список найденных знаний
+            Список найденных знаний; при FTS5 каждая запись содержит snippet с подсветкой
         """
+        if not self.db_service.fts_enabled:
+            query = '''
+                SELECT id, category, topic, content, created_at
+                FROM knowledge
+                WHERE topic LIKE ? OR content LIKE ?
+                ORDER BY created_at DESC
+                LIMIT ? OFFSET ?
+            '''
+            search_pattern = f'%{search_term}%'
+            rows = self.db_service.execute_query(query, (search_pattern, search_pattern, limit, offset))
+            return [dict(row) for row in rows]
+        
+        fts_query = self._build_fts_query(search_term)
+        if not fts_query:
+            return []
+        
         query = '''
-            SELECT id, category, topic, content, created_at
-            FROM knowledge
-            WHERE topic LIKE ? OR content LIKE ?
-            ORDER BY created_at DESC
+            SELECT k.id, k.category, k.topic, k.content, k.created_at,
+                   snippet(knowledge_fts, 1, '*', '*', '…', 12) AS snippet
+            FROM knowledge_fts
+            JOIN knowledge k ON k.id = knowledge_fts.rowid
+            WHERE knowledge_fts MATCH ?
+            ORDER BY bm25(knowledge_fts, 5.0, 1.0)
+            LIMIT ? OFFSET ?
         '''
-        search_pattern = f'%{search_term}%'
-        rows = self.db_service.execute_query(query, (search_pattern, search_pattern))
+        rows = self.db_service.execute_query(query, (fts_query, limit, offset))
         return [dict(row) for row in rows]
     
+    def count_search_results(self, search_term: str) -> int:
+        """
+        Подсчёт количества записей, найденных по ключевым словам
+        
+        Args:
+            search_term: Ключевое слово для поиска
+            
+        Returns:
+            Количество найденных записей
+        """
+        if not self.db_service.fts_enabled:
+            search_pattern = f'%{search_term}%'
+            rows = self.db_service.execute_query(
+                "SELECT COUNT(*) AS total FROM knowledge WHERE topic LIKE ? OR content LIKE ?",
+                (search_pattern, search_pattern)
+            )
+            return rows[0]['total']
+        
+        fts_query = self._build_fts_query(search_term)
+        if not fts_query:
+            return 0
+        
+        rows = self.db_service.execute_query(
+            "SELECT COUNT(*) AS total FROM knowledge_fts WHERE knowledge_fts MATCH ?",
+            (fts_query,)
+        )
+        return rows[0]['total']
+    
     def delete_knowledge(self, knowledge_id: int) -> bool:
         """
         Удаление знания по ID
@@ -180,8 +765,18 @@ class KnowledgeService:
         Returns:
             True если удаление успешно
         """
-        query = "DELETE FROM knowledge WHERE id = ?"
-        rows_affected = self.db_service.execute_update(query, (knowledge_id,))
+        self.wait_ready()
+        
+        with self.db_service.transaction() as conn:
+            version_before = self._get_chunks_version(conn)
+            rows_affected = conn.execute("DELETE FROM knowledge WHERE id = ?", (knowledge_id,)).rowcount
+            if rows_affected > 0:
+                self._advance_index_version(version_before, self._get_chunks_version(conn))
+        
+        if rows_affected > 0:
+            self._index_remove(knowledge_id)
+            self._notify_change(knowledge_id, 'delete')
+        
         return rows_affected > 0
     
     def get_context_for_ai(self, user_query: str = None, max_items: int = 5) -> str:
@@ -195,24 +790,282 @@ class KnowledgeService:
         Returns:
             Строка с контекстом
         """
+        return self.format_context(self.retrieve_knowledge(user_query, max_items))
+    
+    async def get_context_for_ai_async(self, user_query: str = None, max_items: int = 5) -> str:
+        """
+        Асинхронная версия get_context_for_ai: embedding считается фоновым воркером,
+        запросы к БД выполняются в отдельном потоке
+        
+        Args:
+            user_query: Вопрос пользователя для семантического поиска
+            max_items: Максимальное количество записей для контекста
+            
+        Returns:
+            Строка с контекстом
+        """
+        return self.format_context(await self.retrieve_knowledge_async(user_query, max_items))
+    
+    def retrieve_knowledge(self, user_query: str = None, max_items: int = 5) -> List[Dict]:
+        """
+        Отбор записей базы знаний для контекста ИИ
+        
+        При наличии вопроса возвращаются фрагменты записей (content — текст фрагмента,
+        id — ID записи, chunk_id — ID фрагмента), без вопроса — последние записи целиком.
+        
+        Args:
+            user_query: Вопрос пользователя для поиска
+            max_items: Максимальное количество фрагментов или записей
+            
+        Returns:
+            Список знаний по убыванию релевантности
+        """
+        if user_query:
+            self.wait_ready()
+        if user_query and self._hybrid_enabled():
+            # ГИБРИДНЫЙ ПОИСК: полнотекстовый + семантический
+            return self._hybrid_search(user_query, max_items)
         if user_query:
             # СЕМАНТИЧЕСКИЙ ПОИСК
-            knowledge_list = self._semantic_search(user_query, max_items)
-        else:
-            # Обычный поиск (берём последние)
-            knowledge_list = self.get_all_knowledge()[:max_items]
+            return self._semantic_search(user_query, max_items)
+        # Обычный поиск (берём последние)
+        return self.get_all_knowledge()[:max_items]
+    
+    async def retrieve_knowledge_async(self, user_query: str = None, max_items: int = 5) -> List[Dict]:
+        """
+        Асинхронный отбор записей базы знаний для контекста ИИ
+        
+        Args:
+            user_query: Вопрос пользователя для поиска
+            max_items: Максимальное количество фрагментов или записей
+            
+        Returns:
+            Список знаний по убыванию релевантности
+        """
+        if user_query:
+            # Ранние сообщения ждут окончания прогрева
+            await self.wait_ready_async()
+        if user_query and self._hybrid_enabled():
+            return await self._hybrid_search_async(user_query, max_items)
+        if user_query:
+            return await self._semantic_search_async(user_query, max_items)
+        return (await asyncio.to_thread(self.get_all_knowledge))[:max_items]
+    
+    def format_context(self, knowledge_list: List[Dict]) -> str:
+        """
+        Форматирование списка знаний в текстовый контекст для ИИ
         
+        Args:
+            knowledge_list: Список знаний
+            
+        Returns:
+            Строка с контекстом или пустая строка
+        """
         if not knowledge_list:
             return ""
         
         context_parts = ["База знаний:"]
         for item in knowledge_list:
-            context_parts.append(
-                f"\n[{item['category']} - {item['topic']}]: {item['content']}"
-            )
+            context_parts.append(f"\n{self.format_knowledge_item(item)}")
         
         return "\n".join(context_parts)
     
+    @staticmethod
+    def format_knowledge_item(item: Dict) -> str:
+        """
+        Форматирование одной записи знаний для контекста ИИ
+        
+        Args:
+            item: Запись с полями category, topic, content
+            
+        Returns:
+            Строка вида "[Категория - Тема]: Содержимое"
+        """
+        return f"[{item['category']} - {item['topic']}]: {item['content']}"
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """
+        Embedding поискового запроса с использованием кэша
+        
+        Args:
+            query: Текст запроса
+            
+        Returns:
+            Нормализованный вектор запроса
+        """
+        key = EmbeddingCache.make_key(query, self.model_name)
+        embedding = self.query_cache.get(key)
+        
+        if embedding is None:
+            self.wait_ready()
+            embedding = self.query_cache.put(key, self._normalize(self.embedder.encode(query)))
+        
+        return embedding
+    
+    async def encode_query_async(self, query: str) -> np.ndarray:
+        """
+        Асинхронный embedding поискового запроса с использованием кэша
+        
+        Args:
+            query: Текст запроса
+            
+        Returns:
+            Нормализованный вектор запроса
+        """
+        key = EmbeddingCache.make_key(query, self.model_name)
+        embedding = self.query_cache.get(key)
+        
+        if embedding is None:
+            await self.wait_ready_async()
+            embedding = self.query_cache.put(key, self._normalize(await self.embedder.encode_async(query)))
+        
+        return embedding
+    
+    def get_query_cache_stats(self) -> Dict:
+        """
+        Статистика кэша embeddings запросов
+        
+        Returns:
+            Словарь {size, hits, misses, evictions, hit_rate}
+        """
+        return self.query_cache.get_stats()
+    
+    def _hybrid_enabled(self) -> bool:
+        """Гибридный поиск включён в конфиге и SQLite поддерживает FTS5"""
+        return config.HYBRID_SEARCH_ENABLED and self.db_service.fts_enabled
+    
+    def _hybrid_search(self, query: str, top_k: int = 5) -> List[Dict]:
+        """
+        Гибридный поиск: лексический и семантический списки объединяются через RRF
+        
+        Args:
+            query: Поисковый запрос
+            top_k: Количество результатов после объединения
+            
+        Returns:
+            Список наиболее релевантных фрагментов
+        """
+        semantic = self._semantic_search(query, config.HYBRID_SEMANTIC_TOP_K)
+        lexical = self._lexical_search(query, config.HYBRID_LEXICAL_TOP_K)
+        return self._fuse_results(query, [semantic, lexical], top_k)
+    
+    async def _hybrid_search_async(self, query: str, top_k: int = 5) -> List[Dict]:
+        """
+        Асинхронный гибридный поиск: оба источника опрашиваются параллельно
+        
+        Args:
+            query: Поисковый запрос
+            top_k: Количество результатов после объединения
+            
+        Returns:
+            Список наиболее релевантных фрагментов
+        """
+        semantic, lexical = await asyncio.gather(
+            self._semantic_search_async(query, config.HYBRID_SEMANTIC_TOP_K),
+            asyncio.to_thread(self._lexical_search, query, config.HYBRID_LEXICAL_TOP_K),
+        )
+        return self._fuse_results(query, [semantic, lexical], top_k)
+    
+    def _lexical_search(self, query: str, top_k: int = 10) -> List[Dict]:
+        """
+        Полнотекстовый поиск для ИИ: любое слово запроса, ранжирование фрагментов BM25
+        
+        Находит точные термины, которые плохо ловит семантика:
+        методы REST API, коды ошибок, артикулы. Фрагменты ранжируются по BM25
+        в knowledge_chunk_fts (совпадение с темой записи весит больше), от одной
+        записи берётся не больше KNOWLEDGE_PASSAGES_PER_ENTRY фрагментов.
+        
+        Args:
+            query: Поисковый запрос
+            top_k: Количество результатов
+            
+        Returns:
+            Список фрагментов по убыванию релевантности
+        """
+        fts_query = self._build_fts_query(query, match_any=True)
+        if not fts_query or top_k <= 0:
+            return []
+        
+        sql_query = '''
+            SELECT rowid AS chunk_id FROM knowledge_chunk_fts
+            WHERE knowledge_chunk_fts MATCH ?
+            ORDER BY bm25(knowledge_chunk_fts, 5.0, 1.0)
+            LIMIT ?
+        '''
+        rows = self.db_service.execute_query(
+            sql_query, (fts_query, top_k * config.KNOWLEDGE_PASSAGES_PER_ENTRY)
+        )
+        ranked_ids = [row['chunk_id'] for row in rows]
+        if not ranked_ids:
+            return []
+        
+        passages = {passage['chunk_id']: passage for passage in self._load_passages("c.id", ranked_ids)}
+        
+        results = []
+        per_entry = {}
+        for chunk_id in ranked_ids:
+            passage = passages.get(chunk_id)
+            if passage is None or per_entry.get(passage['id'], 0) >= config.KNOWLEDGE_PASSAGES_PER_ENTRY:
+                continue
+            per_entry[passage['id']] = per_entry.get(passage['id'], 0) + 1
+            results.append(passage)
+            if len(results) >= top_k:
+                break
+        
+        return results
+    
+    def _load_passages(self, column: str, values: List[int]) -> List[Dict]:
+        """
+        Загрузка фрагментов вместе с полями родительской записи
+        
+        Args:
+            column: Колонка отбора: "c.id" (ID фрагментов) или "c.knowledge_id" (ID записей)
+            values: Значения для отбора
+            
+        Returns:
+            Список фрагментов {id, chunk_id, chunk_index, category, topic, content, created_at}
+            в порядке (knowledge_id, chunk_index)
+        """
+        placeholders = ", ".join("?" * len(values))
+        sql_query = f'''
+            SELECT k.id, c.id AS chunk_id, c.chunk_index, k.category, k.topic, c.content, k.created_at
+            FROM knowledge_chunk c
+            JOIN knowledge k ON k.id = c.knowledge_id
+            WHERE {column} IN ({placeholders})
+            ORDER BY c.knowledge_id, c.chunk_index
+        '''
+        return [dict(row) for row in self.db_service.execute_query(sql_query, tuple(values))]
+    
+    @staticmethod
+    def _fuse_results(query: str, ranked_lists: List[List[Dict]], top_k: int) -> List[Dict]:
+        """
+        Объединение ранжированных списков фрагментов методом Reciprocal Rank Fusion
+        
+        Args:
+            query: Исходный запрос (для логирования)
+            ranked_lists: Списки фрагментов, каждый по убыванию релевантности
+            top_k: Количество результатов
+            
+        Returns:
+            Объединённый список фрагментов
+        """
+        scores = {}
+        items = {}
+        for ranked in ranked_lists:
+            for rank, item in enumerate(ranked, start=1):
+                scores[item['chunk_id']] = scores.get(item['chunk_id'], 0.0) + 1.0 / (config.HYBRID_RRF_K + rank)
+                items.setdefault(item['chunk_id'], item)
+        
+        top_ids = sorted(scores, key=scores.get, reverse=True)[:top_k]
+        
+        print(f"\n=== Гибридный поиск (RRF): '{query}' ===")
+        for chunk_id in top_ids:
+            item = items[chunk_id]
+            print(f"  {scores[chunk_id]:.4f} | {item['category']} - {item['topic']} #{item['chunk_index']}")
+        print("=" * 50)
+        
+        return [items[chunk_id] for chunk_id in top_ids]
+    
     def _semantic_search(self, query: str, top_k: int = 5) -> List[Dict]:
         """
         Семантический поиск по базе знаний
@@ -222,60 +1075,177 @@ class KnowledgeService:
             top_k: Количество результатов
             
         Returns:
-            Список наиболее релевантных знаний
+            Список наиболее релевантных фрагментов
         """
-        # Получаем все знания с embeddings
-        sql_query = "SELECT id, category, topic, content, embedding, created_at FROM knowledge"
-        rows = self.db_service.execute_query(sql_query)
+        if not len(self._index[0]) or top_k <= 0:
+            return []
         
-        if not rows:
+        query_embedding = self.encode_query(query)
+        return self._search_by_embedding(query, query_embedding, top_k)
+    
+    async def _semantic_search_async(self, query: str, top_k: int = 5) -> List[Dict]:
+        """
+        Асинхронный семантический поиск: одновременные запросы кодируются одной пачкой
+        
+        Args:
+            query: Поисковый запрос
+            top_k: Количество результатов
+            
+        Returns:
+            Список наиболее релевантных фрагментов
+        """
+        if not len(self._index[0]) or top_k <= 0:
             return []
         
-        # Генерируем embedding для запроса
-        query_embedding = self.model.encode(query)
+        query_embedding = await self.encode_query_async(query)
+        return await asyncio.to_thread(self._search_by_embedding, query, query_embedding, top_k)
+    
+    def _search_by_embedding(self, query: str, query_embedding, top_k: int) -> List[Dict]:
+        """
+        Поиск ближайших фрагментов к готовому embedding запроса
+        
+        От одной записи берётся не больше KNOWLEDGE_PASSAGES_PER_ENTRY фрагментов,
+        чтобы длинный документ не вытеснял остальные. Начиная с ANN_MIN_ITEMS
+        фрагментов кандидаты берутся из ANN-индекса, на меньших объёмах — перебором
+        матрицы; в сжатых режимах перебор даёт EMBEDDING_RESCORE_CANDIDATES кандидатов,
+        которые переоцениваются по полным float32 embeddings из БД.
         
-        # Вычисляем сходство с каждой записью
-        similarities = []
-        for row in rows:
-            row_dict = dict(row)
+        Args:
+            query: Исходный текст запроса (для логирования)
+            query_embedding: Embedding запроса
+            top_k: Количество результатов
             
-            if row_dict['embedding'] is None:
-                continue
+        Returns:
+            Список наиболее релевантных фрагментов
+        """
+        # Снимок индекса: кортеж меняется атомарно при add/update/delete
+        chunk_ids, knowledge_ids, matrix, scales = self._index
+        
+        if not len(chunk_ids):
+            return []
+        
+        query_embedding = self._normalize(query_embedding)
+        
+        # Кандидаты с запасом на ограничение фрагментов одной записи
+        k = min(top_k * config.KNOWLEDGE_PASSAGES_PER_ENTRY, len(chunk_ids))
+        if self.ann_index and len(chunk_ids) >= config.ANN_MIN_ITEMS:
+            candidate_ids, candidate_scores = self.ann_index.search(query_embedding, k)
+            # chunk_ids отсортированы: новые фрагменты получают большие ID и добавляются в конец
+            positions = np.searchsorted(chunk_ids, candidate_ids)
+            candidates = [
+                (chunk_id, int(knowledge_ids[pos]), score)
+                for chunk_id, pos, score in zip(candidate_ids, positions, candidate_scores)
+                if pos < len(chunk_ids) and chunk_ids[pos] == chunk_id
+            ]
+        else:
+            # Косинусное сходство со всеми фрагментами (по кодам индекса)
+            similarities = self._scan_similarities(matrix, scales, query_embedding)
             
-            # Десериализуем embedding из БД
-            knowledge_embedding = pickle.loads(row_dict['embedding'])
+            # Шорт-лист для переоценки в сжатых режимах, топ-K без полной сортировки
+            shortlist = k if self.index_dtype == 'float32' else max(k, config.EMBEDDING_RESCORE_CANDIDATES)
+            shortlist = min(shortlist, len(chunk_ids))
+            if shortlist < len(chunk_ids):
+                top_positions = np.argpartition(-similarities, shortlist - 1)[:shortlist]
+            else:
+                top_positions = np.arange(len(chunk_ids))
             
-            # Вычисляем косинусное сходство
-            similarity = np.dot(query_embedding, knowledge_embedding) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(knowledge_embedding)
-            )
+            if self.index_dtype != 'float32':
+                similarities = similarities.copy()
+                similarities[top_positions] = self._rescore(
+                    chunk_ids[top_positions], similarities[top_positions], query_embedding
+                )
             
-            similarities.append((similarity, row_dict))
+            top_positions = top_positions[np.argsort(-similarities[top_positions])]
+            candidates = [
+                (int(chunk_ids[pos]), int(knowledge_ids[pos]), float(similarities[pos]))
+                for pos in top_positions
+            ]
         
-        # Сортируем по убыванию сходства
-        similarities.sort(reverse=True, key=lambda x: x[0])
+        top_scores = {}
+        per_entry = {}
+        for chunk_id, knowledge_id, score in candidates:
+            if per_entry.get(knowledge_id, 0) >= config.KNOWLEDGE_PASSAGES_PER_ENTRY:
+                continue
+            per_entry[knowledge_id] = per_entry.get(knowledge_id, 0) + 1
+            top_scores[chunk_id] = score
+            if len(top_scores) == top_k:
+                break
         
-        # Берём топ-K
-        top_results = similarities[:top_k]
+        # Подгружаем из БД только найденные фрагменты
+        passages_by_id = {
+            passage['chunk_id']: passage
+            for passage in self._load_passages("c.id", list(top_scores))
+        }
+        top_results = [passages_by_id[chunk_id] for chunk_id in top_scores if chunk_id in passages_by_id]
+        for item in top_results:
+            item['similarity'] = top_scores[item['chunk_id']]
         
         # Логируем результаты поиска
         print(f"\n=== Семантический поиск: '{query}' ===")
-        for similarity, item in top_results:
-            print(f"  {similarity:.3f} | {item['category']} - {item['topic']}")
+        for item in top_results:
+            print(f"  {item['similarity']:.3f} | {item['category']} - {item['topic']} #{item['chunk_index']}")
         print("=" * 50)
         
-        # Возвращаем без embedding (он не нужен в выводе)
-        return [{
-            'id': item['id'],
-            'category': item['category'],
-            'topic': item['topic'],
-            'content': item['content'],
-            'created_at': item['created_at']
-        } for similarity, item in top_results]
+        return top_results
+    
+    @staticmethod
+    def _scan_similarities(matrix: np.ndarray, scales, query_embedding: np.ndarray) -> np.ndarray:
+        """
+        Скалярные произведения запроса со всеми векторами индекса
+        
+        Сжатые коды переводятся в float32 блоками по _SCAN_BLOCK_ROWS строк:
+        из памяти читается 2 (float16) или 1 (int8) байт на измерение,
+        а временный буфер не растёт с размером базы.
+        
+        Args:
+            matrix: Матрица кодов
+            scales: Масштабы векторов для int8 (None для float-режимов)
+            query_embedding: Нормализованный вектор запроса float32
+            
+        Returns:
+            Массив сходств float32
+        """
+        if matrix.dtype == np.float32:
+            return matrix @ query_embedding
+        
+        similarities = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), KnowledgeService._SCAN_BLOCK_ROWS):
+            block = matrix[start:start + KnowledgeService._SCAN_BLOCK_ROWS]
+            similarities[start:start + len(block)] = block.astype(np.float32) @ query_embedding
+        
+        if scales is not None:
+            similarities *= scales
+        return similarities
+    
+    def _rescore(self, chunk_ids: np.ndarray, approx_scores: np.ndarray, query_embedding: np.ndarray) -> np.ndarray:
+        """
+        Точные сходства для шорт-листа по полным float32 embeddings фрагментов из БД
+        
+        Args:
+            chunk_ids: ID фрагментов шорт-листа
+            approx_scores: Приближённые сходства (остаются для фрагментов, удалённых из БД)
+            query_embedding: Нормализованный вектор запроса
+            
+        Returns:
+            Массив сходств в порядке chunk_ids
+        """
+        placeholders = ", ".join("?" * len(chunk_ids))
+        rows = self.db_service.execute_query(
+            f"SELECT id, embedding, embedding_dim FROM knowledge_chunk WHERE id IN ({placeholders})",
+            tuple(int(chunk_id) for chunk_id in chunk_ids)
+        )
+        exact = {
+            row['id']: float(self._normalize(decode_embedding(row['embedding'], row['embedding_dim'])) @ query_embedding)
+            for row in rows
+        }
+        return np.array(
+            [exact.get(int(chunk_id), score) for chunk_id, score in zip(chunk_ids, approx_scores)],
+            dtype=np.float32
+        )
     
     def update_knowledge(self, knowledge_id: int, category: str, topic: str, content: str) -> bool:
         """
-        Обновление существующей записи знаний с пересчётом embedding
+        Обновление существующей записи знаний с пересчётом фрагментов и их embeddings
         
         Args:
             knowledge_id: ID записи для обновления
@@ -286,21 +1256,76 @@ class KnowledgeService:
         Returns:
             True если обновление успешно
         """
-        # Генерируем новый embedding
-        embedding = self.model.encode(content)
-        embedding_blob = pickle.dumps(embedding)
+        self.wait_ready()
         
-        query = '''
-            UPDATE knowledge 
-            SET category = ?, topic = ?, content = ?, embedding = ?
-            WHERE id = ?
-        '''
-        rows_affected = self.db_service.execute_update(
-            query, 
-            (category, topic, content, embedding_blob, knowledge_id)
+        # Генерируем embeddings новых фрагментов
+        passages = self._split_content(content)
+        embeddings = self.embedder.encode_many(
+            [self._chunk_embedding_text(topic, passage) for passage in passages]
         )
+        
+        chunk_ids = []
+        with self.db_service.transaction() as conn:
+            version_before = self._get_chunks_version(conn)
+            cursor = conn.execute(
+                "UPDATE knowledge SET category = ?, topic = ?, content = ? WHERE id = ?",
+                (category, topic, content, knowledge_id)
+            )
+            rows_affected = cursor.rowcount
+            if rows_affected > 0:
+                chunk_ids = self._write_chunks(conn, knowledge_id, passages, embeddings)
+                self._advance_index_version(version_before, self._get_chunks_version(conn))
+        
+        if rows_affected > 0:
+            if chunk_ids:
+                self._index_replace(knowledge_id, chunk_ids, embeddings)
+            else:
+                self._index_remove(knowledge_id)
+            self._notify_change(knowledge_id, 'update')
+        
         return rows_affected > 0
     
+    async def add_knowledge_async(self, category: str, topic: str, content: str) -> int:
+        """
+        Асинхронное добавление знания (кодирование и запись вне event loop)
+        
+        Args:
+            category: Категория знания
+            topic: Тема знания
+            content: Содержимое знания
+            
+        Returns:
+            ID добавленной записи
+        """
+        return await asyncio.to_thread(self.add_knowledge, category, topic, content)
+    
+    async def update_knowledge_async(self, knowledge_id: int, category: str, topic: str, content: str) -> bool:
+        """
+        Асинхронное обновление знания (кодирование и запись вне event loop)
+        
+        Args:
+            knowledge_id: ID записи для обновления
+            category: Новая категория
+            topic: Новая тема
+            content: Новое содержимое
+            
+        Returns:
+            True если обновление успешно
+        """
+        return await asyncio.to_thread(self.update_knowledge, knowledge_id, category, topic, content)
+    
+    async def delete_knowledge_async(self, knowledge_id: int) -> bool:
+        """
+        Асинхронное удаление знания (ожидание прогрева и запись вне event loop)
+        
+        Args:
+            knowledge_id: ID знания для удаления
+            
+        Returns:
+            True если удаление успешно
+        """
+        return await asyncio.to_thread(self.delete_knowledge, knowledge_id)
+    
     def get_knowledge_by_id(self, knowledge_id: int) -> dict:
         """
         Получение конкретной записи по ID
@@ -396,3 +1421,26 @@ class KnowledgeService:
             return (True, f"Знание успешно добавлено! ID: {knowledge_id}", knowledge_id)
         else:
             return (False, "Ошибка при добавлении в базу данных.", 0)
+    
+    async def add_knowledge_from_file_async(self, file_content: str) -> tuple:
+        """
+        Асинхронное добавление знания из файла (кодирование и запись вне event loop)
+        
+        Args:
+            file_content: Содержимое текстового файла
+            
+        Returns:
+            Кортеж (success: bool, message: str, knowledge_id: int)
+        """
+        return await asyncio.to_thread(self.add_knowledge_from_file, file_content)
+    
+    def close(self):
+        """Остановка фонового воркера embeddings, сохранение файла embeddings и ANN-индекса"""
+        if self._warm_up_thread is not None:
+            self._warm_up_thread.join()
+        if self.embedder:
+            self.embedder.close()
+        if self._sidecar_dirty:
+            self._save_sidecar()
+        if self.ann_index:
+            self.ann_index.save()
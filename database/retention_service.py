@@ -0,0 +1,137 @@
+"""Сервис хранения истории диалогов: архивирование и очистка"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+import sys
+sys.path.append('..')
+from database.db_service import DatabaseService
+import config
+
+
+class RetentionService:
+    """Класс фоновой задачи переноса старых сообщений в архивную БД"""
+    
+    def __init__(self, db_service: DatabaseService, archive_path: str = config.HISTORY_ARCHIVE_PATH,
+                 retention_days: int = config.HISTORY_RETENTION_DAYS):
+        """
+        Инициализация сервиса хранения
+        
+        Args:
+            db_service: Сервис базы данных
+            archive_path: Путь к файлу архивной БД
+            retention_days: Сколько дней сообщения хранятся в основной БД
+        """
+        self.db_service = db_service
+        self.archive_path = archive_path
+        self.retention_days = retention_days
+        self._task = None
+    
+    def start(self) -> asyncio.Task:
+        """
+        Запуск периодической задачи в текущем event loop
+        
+        Returns:
+            Задача asyncio
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run_periodically())
+        return self._task
+    
+    async def stop(self):
+        """Остановка периодической задачи"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    async def _run_periodically(self):
+        """Цикл задачи: перенос раз в HISTORY_RETENTION_INTERVAL секунд"""
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+            except Exception as e:
+                print(f"Ошибка при архивировании истории диалогов: {e}")
+            await asyncio.sleep(config.HISTORY_RETENTION_INTERVAL)
+    
+    def run_once(self) -> int:
+        """
+        Перенос сообщений старше срока хранения в архив и освобождение места
+        
+        Каждая пачка переносится отдельной транзакцией, чтобы не держать
+        соединение записи долго. Вставка в архив идемпотентна (INSERT OR IGNORE
+        по id), поэтому повтор после сбоя между фиксациями не создаёт дубликатов.
+        
+        Returns:
+            Количество перенесённых сообщений
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+        batch_size = config.HISTORY_RETENTION_BATCH_SIZE
+        started_at = time.perf_counter()
+        moved = 0
+        
+        with self.db_service.transaction() as conn:
+            conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        
+        try:
+            with self.db_service.transaction() as conn:
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS archive.conversation_history (
+                        id INTEGER PRIMARY KEY,
+                        user_id INTEGER NOT NULL,
+                        username VARCHAR(100),
+                        user_first_name VARCHAR(100),
+                        role VARCHAR(20) NOT NULL,
+                        message TEXT NOT NULL,
+                        created_at TIMESTAMP,
+                        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                conn.execute('''
+                    CREATE INDEX IF NOT EXISTS archive.idx_archive_user_created
+                    ON conversation_history(user_id, created_at, id)
+                ''')
+            
+            while True:
+                with self.db_service.transaction() as conn:
+                    ids = [row[0] for row in conn.execute('''
+                        SELECT id FROM main.conversation_history
+                        WHERE created_at < ?
+                        ORDER BY created_at
+                        LIMIT ?
+                    ''', (cutoff, batch_size))]
+                    
+                    if not ids:
+                        break
+                    
+                    placeholders = ", ".join("?" * len(ids))
+                    conn.execute(f'''
+                        INSERT OR IGNORE INTO archive.conversation_history
+                        (id, user_id, username, user_first_name, role, message, created_at)
+                        SELECT id, user_id, username, user_first_name, role, message, created_at
+                        FROM main.conversation_history
+                        WHERE id IN ({placeholders})
+                    ''', ids)
+                    conn.execute(
+                        f"DELETE FROM main.conversation_history WHERE id IN ({placeholders})",
+                        ids
+                    )
+                
+                moved += len(ids)
+        finally:
+            with self.db_service.transaction() as conn:
+                conn.execute("DETACH DATABASE archive")
+        
+        if moved:
+            # Возвращаем освободившиеся страницы файловой системе
+            with self.db_service.transaction() as conn:
+                conn.execute(f"PRAGMA main.incremental_vacuum({int(config.HISTORY_VACUUM_PAGES)})").fetchall()
+            
+            elapsed = time.perf_counter() - started_at
+            print(f"Архивировано сообщений истории: {moved} (старше {cutoff}) за {elapsed:.1f} с")
+        
+        return moved
@@ -1,9 +1,12 @@
 """Обработчики событий сообщений"""
 
 from telethon import events
+import asyncio
 import sys
+import time
 sys.path.append('..')
 from services.ai_service import AIService
+from services.message_dispatcher import MessageDispatcher
 from services.telegram_service import TelegramService
 import config
 
@@ -11,17 +14,67 @@ import config
 class MessageHandler:
     """Класс для обработки входящих сообщений"""
     
-    def __init__(self, telegram_service: TelegramService, ai_service: AIService):
+    def __init__(self, telegram_service: TelegramService, ai_service: AIService, dispatcher: MessageDispatcher):
         """
         Инициализация обработчика
         
         Args:
             telegram_service: Сервис Telegram
             ai_service: Сервис AI
+            dispatcher: Диспетчер очередей пользователей (лимит запросов к LLM применяет AIService)
         """
         self.telegram_service = telegram_service
         self.ai_service = ai_service
+        self.dispatcher = dispatcher
         self.greeted_users = set()
+        
+        # Сообщения, ожидающие окончания окна склейки: sender_id -> события, время первого, таймер
+        self._pending = {}
+    
+    def _schedule_message(self, event):
+        """
+        Добавление сообщения в окно склейки отправителя
+        
+        Каждое новое сообщение продлевает окно на MESSAGE_DEBOUNCE_SECONDS, но не дольше
+        MESSAGE_DEBOUNCE_MAX_SECONDS от первого сообщения. По истечении окна сообщения
+        уходят в очередь отправителя одним запросом.
+        
+        Args:
+            event: Событие нового сообщения
+        """
+        sender_id = event.sender_id
+        now = time.monotonic()
+        
+        pending = self._pending.get(sender_id)
+        if pending is None:
+            pending = self._pending[sender_id] = {'events': [], 'first_at': now, 'timer': None}
+        else:
+            pending['timer'].cancel()
+        pending['events'].append(event)
+        
+        delay = min(
+            config.MESSAGE_DEBOUNCE_SECONDS,
+            pending['first_at'] + config.MESSAGE_DEBOUNCE_MAX_SECONDS - now
+        )
+        pending['timer'] = asyncio.get_running_loop().call_later(
+            max(delay, 0), self._flush_messages, sender_id
+        )
+    
+    def _flush_messages(self, sender_id: int):
+        """
+        Передача накопленных сообщений отправителя в диспетчер одной задачей
+        
+        Args:
+            sender_id: ID отправителя
+        """
+        pending = self._pending.pop(sender_id, None)
+        if pending is None:
+            return
+        
+        batch = pending['events']
+        if len(batch) > 1:
+            print(f"Склеено {len(batch)} сообщений от пользователя {sender_id}")
+        self.dispatcher.submit(sender_id, lambda: self.handle_incoming_messages(batch))
     
     async def handle_incoming_message(self, event):
         """
@@ -30,6 +83,19 @@ class MessageHandler:
         Args:
             event: Событие нового сообщения
         """
+        await self.handle_incoming_messages([event])
+    
+    async def handle_incoming_messages(self, batch: list):
+        """
+        Обработка нескольких подряд идущих сообщений отправителя одним AI-ответом
+        
+        Тексты объединяются в один вопрос: один поиск по базе знаний,
+        один запрос к LLM и один ответ на последнее сообщение.
+        
+        Args:
+            batch: События сообщений одного отправителя в порядке получения
+        """
+        event = batch[-1]
         try:
             # Получение информации об отправителе
             sender = await event.get_sender()
@@ -47,7 +113,7 @@ class MessageHandler:
             sender_id = event.sender_id
             sender_name = sender.first_name or "Пользователь"
             sender_username = sender.username if sender.username else None
-            user_message = event.message.text
+            user_message = "\n".join(e.message.text for e in batch if e.message.text)
             
             # Проверяем, что сообщение содержит текст
             if not user_message:
@@ -56,16 +122,28 @@ class MessageHandler:
             
             print(f"Получено сообщение от {sender_name} (@{sender_username}, ID: {sender_id}): {user_message}")
             
-            # Генерируем ответ с передачей username
-            ai_response = self.ai_service.generate_response(
-                user_message=user_message,
-                user_name=sender_name,
-                user_id=sender_id,
-                username=sender_username  # ← ИСПРАВЛЕНО: передаём username
-            )
-            
-            # Отправка ответа
-            await self.telegram_service.send_message(event, ai_response)
+            if config.AI_STREAMING_ENABLED:
+                # Ответ появляется у пользователя с первыми токенами и дописывается правками
+                ai_response = await self.telegram_service.send_streaming_message(
+                    event,
+                    self.ai_service.generate_response_stream(
+                        user_message=user_message,
+                        user_name=sender_name,
+                        user_id=sender_id,
+                        username=sender_username
+                    )
+                )
+            else:
+                # Генерируем ответ с передачей username
+                ai_response = await self.ai_service.generate_response(
+                    user_message=user_message,
+                    user_name=sender_name,
+                    user_id=sender_id,
+                    username=sender_username  # ← ИСПРАВЛЕНО: передаём username
+                )
+                
+                # Отправка ответа
+                await self.telegram_service.send_message(event, ai_response)
             
             print(f"Отправлен AI-ответ пользователю {sender_name}: {ai_response}")
             
@@ -85,4 +163,9 @@ class MessageHandler:
             func=lambda e: e.is_private
         ))
         async def on_new_message(event):
-            await self.handle_incoming_message(event)
+            # Сообщения одного чата обрабатываются по порядку, разных чатов — параллельно
+            if config.MESSAGE_DEBOUNCE_SECONDS > 0:
+                # Серия коротких сообщений подряд превращается в один вопрос
+                self._schedule_message(event)
+            else:
+                self.dispatcher.submit(event.sender_id, lambda: self.handle_incoming_message(event))
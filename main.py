@@ -1,13 +1,7 @@
 """Точка входа приложения"""
 
 import asyncio
-from services.telegram_service import TelegramService
-from services.ai_service import AIService
-from handlers.message_handler import MessageHandler
-from database.db_service import DatabaseService
-from database.knowledge_service import KnowledgeService
-from admin_bot.admin_bot import AdminBot
-import config
+from services.service_container import ServiceContainer
 
 
 async def run_admin_bot_async(admin_bot):
@@ -18,18 +12,17 @@ async def run_admin_bot_async(admin_bot):
     print("Админ-бот запущен...")
 
 
-async def run_user_bot():
+async def run_user_bot(services: ServiceContainer):
     """Запуск пользовательского бота"""
-    # Инициализация базы данных
-    db_service = DatabaseService(config.DATABASE_PATH)
-    knowledge_service = KnowledgeService(db_service)
+    # Telethon импортируется после запуска прогрева модели
+    from services.telegram_service import TelegramService
+    from handlers.message_handler import MessageHandler
     
     # Инициализация сервисов
     telegram_service = TelegramService()
-    ai_service = AIService(knowledge_service)
     
     # Инициализация обработчика сообщений
-    message_handler = MessageHandler(telegram_service, ai_service)
+    message_handler = MessageHandler(telegram_service, services.ai_service, services.message_dispatcher)
     
     # Запуск Telegram клиента
     async with telegram_service.get_client() as client:
@@ -46,15 +39,31 @@ async def run_user_bot():
 
 async def main():
     """Главная функция - запуск обоих ботов в одном event loop"""
-    # Инициализация админ-бота
-    admin_bot = AdminBot()
+    # Общие сервисы (БД, модель, индекс) создаются один раз
+    services = ServiceContainer()
     
-    # Создаем задачи для обоих ботов
-    admin_task = asyncio.create_task(run_admin_bot_async(admin_bot))
-    user_task = asyncio.create_task(run_user_bot())
+    # Модель и индекс загружаются в фоне, пока импортируются и подключаются Telegram-клиенты
+    services.start_warm_up()
     
-    # Запускаем обе задачи параллельно
-    await asyncio.gather(admin_task, user_task)
+    try:
+        # Архивирование старой истории диалогов в фоне
+        if services.retention_service:
+            services.retention_service.start()
+        
+        # Инициализация админ-бота (python-telegram-bot импортируется после запуска прогрева)
+        from admin_bot.admin_bot import AdminBot
+        admin_bot = AdminBot(services.knowledge_service, services.ai_service, services.message_dispatcher)
+        
+        # Создаем задачи для обоих ботов
+        admin_task = asyncio.create_task(run_admin_bot_async(admin_bot))
+        user_task = asyncio.create_task(run_user_bot(services))
+        
+        # Запускаем обе задачи параллельно
+        await asyncio.gather(admin_task, user_task)
+    finally:
+        if services.retention_service:
+            await services.retention_service.stop()
+        services.close()
 
 
 if __name__ == '__main__':
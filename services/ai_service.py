@@ -1,34 +1,75 @@
 """Сервис для работы с AI"""
 
-from openai import OpenAI
+import asyncio
+import contextlib
+from typing import AsyncIterator, Callable
 import sys
 sys.path.append('..')
+from services.response_cache import SemanticResponseCache
+from services.prompt_builder import PromptBuilder
 import config
 
 
 class AIService:
     """Класс для генерации ответов через AI"""
     
-    def __init__(self, knowledge_service=None, conversation_service=None):
+    def __init__(self, knowledge_service=None, conversation_service=None, llm_slot: Callable = None):
         """
-        Инициализация клиента OpenAI
+        Инициализация сервиса (клиент OpenAI создаётся при первом обращении или в warm_up)
         
         Args:
             knowledge_service: Сервис базы знаний (опционально)
             conversation_service: Сервис истории диалогов (опционально)
+            llm_slot: Фабрика асинхронного контекста — места в общем пуле запросов к LLM
+                (например, MessageDispatcher.llm_slot); None — без ограничения
         """
-        self.client = OpenAI(
-            base_url=config.OPENAI_BASE_URL,
-            api_key=config.OPENAI_API_KEY,
-        )
+        self._client = None
         self.model = config.AI_MODEL
         self.knowledge_service = knowledge_service
         self.conversation_service = conversation_service
+        self.llm_slot = llm_slot
+        
+        # Сборка промпта в пределах бюджета токенов
+        self.prompt_builder = PromptBuilder(
+            knowledge_service.format_knowledge_item if knowledge_service else str
+        )
+        
+        # Кэш ответов на перефразированные вопросы, сбрасывается при изменении базы знаний
+        self.response_cache = None
+        if config.RESPONSE_CACHE_ENABLED and knowledge_service:
+            self.response_cache = SemanticResponseCache(
+                similarity_threshold=config.RESPONSE_CACHE_SIMILARITY,
+                max_size=config.RESPONSE_CACHE_SIZE,
+                ttl_seconds=config.RESPONSE_CACHE_TTL
+            )
+            knowledge_service.add_change_listener(self.response_cache.on_knowledge_changed)
+    
+    @property
+    def client(self):
+        """Асинхронный клиент OpenAI; пакет openai импортируется при первом обращении"""
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(
+                base_url=config.OPENAI_BASE_URL,
+                api_key=config.OPENAI_API_KEY,
+            )
+        return self._client
     
-    def generate_response(self, user_message: str, user_name: str = "Пользователь", 
-                         user_id: int = None, username: str = None) -> str:
+    def _llm_request_slot(self):
+        """Место в пуле запросов к LLM на время запроса (без ограничителя — сразу)"""
+        return self.llm_slot() if self.llm_slot else contextlib.nullcontext()
+    
+    def warm_up(self):
+        """Заблаговременное создание клиента OpenAI (вызывается в фоновом потоке при старте)"""
+        try:
+            self.client
+        except Exception as e:
+            print(f"Ошибка инициализации клиента OpenAI: {e}")
+    
+    async def generate_response(self, user_message: str, user_name: str = "Пользователь", 
+                                user_id: int = None, username: str = None) -> str:
         """
-        Генерирует ответ на основе сообщения пользователя
+        Генерирует ответ на основе сообщения пользователя, не блокируя event loop
         
         Args:
             user_message: Текст сообщения пользователя
@@ -40,58 +81,23 @@ class AIService:
             Сгенерированный ответ или сообщение об ошибке
         """
         try:
-            # Получение РЕЛЕВАНТНОГО контекста из базы знаний с семантическим поиском
-            knowledge_context = ""
-            if self.knowledge_service:
-                knowledge_context = self.knowledge_service.get_context_for_ai(
-                    user_query=user_message,  # Передаём вопрос для семантического поиска
-                    max_items=5  # Топ-5 релевантных знаний
-                )
-            
-            # Формирование системного промпта
-            system_prompt = config.AI_SYSTEM_PROMPT
-            if knowledge_context:
-                system_prompt += f"\n\n{knowledge_context}"
+            request = await self._prepare_request(user_message, user_id)
             
-            # Формирование истории сообщений для API
-            messages = [{"role": "system", "content": system_prompt}]
+            if request['cached_response']:
+                await self._save_history(user_id, username, user_name, user_message, request['cached_response'])
+                return request['cached_response']
             
-            # Добавляем историю диалога если есть user_id
-            if user_id and self.conversation_service:
-                history = self.conversation_service.get_user_history(user_id, limit=6)
-                
-                # Добавляем историю в формате OpenAI
-                for msg in history:
-                    messages.append({
-                        "role": msg['role'],
-                        "content": msg['message']
-                    })
-            
-            # Добавляем текущее сообщение пользователя
-            messages.append({
-                "role": "user",
-                "content": user_message
-            })
-            
-            # Генерация ответа
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=config.AI_MAX_TOKENS,
-            )
+            # Генерация ответа: место в пуле занято только на время запроса
+            async with self._llm_request_slot():
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=request['messages'],
+                    max_tokens=config.AI_MAX_TOKENS,
+                )
             
             if response.choices:
                 ai_response = response.choices[0].message.content.strip()
-                
-                # Сохраняем сообщение пользователя и ответ AI в историю
-                if user_id and self.conversation_service:
-                    self.conversation_service.add_message(
-                        user_id, username, user_name, 'user', user_message
-                    )
-                    self.conversation_service.add_message(
-                        user_id, username, user_name, 'assistant', ai_response
-                    )
-                
+                await self._finish_response(request, user_id, username, user_name, user_message, ai_response)
                 return ai_response
             
             return "Извини, не могу сейчас ответить. Попробуй позже!"
@@ -99,3 +105,197 @@ class AIService:
         except Exception as e:
             print(f"Ошибка при генерации ответа AI: {e}")
             return "Произошла ошибка при обработке сообщения. Попробуй ещё раз!"
+    
+    async def generate_response_stream(self, user_message: str, user_name: str = "Пользователь",
+                                       user_id: int = None, username: str = None) -> AsyncIterator[str]:
+        """
+        Генерирует ответ в потоковом режиме: фрагменты текста отдаются по мере получения
+        
+        Args:
+            user_message: Текст сообщения пользователя
+            user_name: Имя пользователя
+            user_id: ID пользователя для истории диалога
+            username: Username пользователя (без @)
+            
+        Yields:
+            Очередной фрагмент ответа (ответ из кэша или сообщение об ошибке — одним фрагментом)
+        """
+        parts = []
+        try:
+            request = await self._prepare_request(user_message, user_id)
+            
+            if request['cached_response']:
+                await self._save_history(user_id, username, user_name, user_message, request['cached_response'])
+                yield request['cached_response']
+                return
+            
+            # Место в пуле освобождается с концом потока, до финальной правки сообщения
+            async with self._llm_request_slot():
+                stream = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=request['messages'],
+                    max_tokens=config.AI_MAX_TOKENS,
+                    stream=True,
+                )
+                
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            
+            ai_response = "".join(parts).strip()
+            if not ai_response:
+                yield "Извини, не могу сейчас ответить. Попробуй позже!"
+                return
+            
+            await self._finish_response(request, user_id, username, user_name, user_message, ai_response)
+            
+        except Exception as e:
+            print(f"Ошибка при потоковой генерации ответа AI: {e}")
+            if not parts:
+                yield "Произошла ошибка при обработке сообщения. Попробуй ещё раз!"
+    
+    async def _prepare_request(self, user_message: str, user_id: int = None) -> dict:
+        """
+        Подготовка запроса к модели: история, проверка кэша (только без истории) и контекст базы знаний
+        
+        Args:
+            user_message: Текст сообщения пользователя
+            user_id: ID пользователя для истории диалога
+            
+        Returns:
+            Словарь {messages, knowledge_items, token_report, question_embedding,
+                     cache_version, cached_response}
+        """
+        request = {
+            'messages': [],
+            'knowledge_items': [],
+            'token_report': {},
+            'question_embedding': None,
+            'cache_version': None,
+            'cached_response': None,
+        }
+        
+        if self.response_cache:
+            request['cache_version'] = self.response_cache.version
+            history, question_embedding = await asyncio.gather(
+                self._get_history(user_id),
+                self.knowledge_service.encode_query_async(user_message),
+            )
+            
+            # Кэш ответов только для вопросов без истории: уточнения вроде "а как его удалить?"
+            # похожи у всех пользователей, но ответ на них зависит от предыдущего диалога
+            if not history:
+                request['question_embedding'] = question_embedding
+                request['cached_response'] = self.response_cache.lookup(question_embedding)
+                
+                if request['cached_response']:
+                    return request
+            
+            knowledge_items = await self._get_knowledge_items(user_message)
+        else:
+            # Контекст из базы знаний и история диалога загружаются параллельно
+            knowledge_items, history = await asyncio.gather(
+                self._get_knowledge_items(user_message),
+                self._get_history(user_id),
+            )
+        request['knowledge_items'] = knowledge_items
+        
+        # Системный промпт, знания, история и вопрос в пределах бюджета токенов
+        messages, request['token_report'] = self.prompt_builder.build(
+            config.AI_SYSTEM_PROMPT, knowledge_items, history, user_message
+        )
+        
+        request['messages'] = messages
+        return request
+    
+    async def _finish_response(self, request: dict, user_id: int, username: str, user_name: str,
+                               user_message: str, ai_response: str):
+        """
+        Сохранение готового ответа в кэш и историю диалога
+        
+        Args:
+            request: Результат _prepare_request
+            user_id: ID пользователя
+            username: Username пользователя (без @)
+            user_name: Имя пользователя
+            user_message: Текст сообщения пользователя
+            ai_response: Ответ AI
+        """
+        if request['question_embedding'] is not None and ai_response:
+            self.response_cache.store(
+                request['question_embedding'],
+                [item['id'] for item in request['knowledge_items']],
+                ai_response,
+                request['cache_version']
+            )
+        
+        # Сохраняем сообщение пользователя и ответ AI в историю
+        await self._save_history(user_id, username, user_name, user_message, ai_response)
+    
+    async def _get_knowledge_items(self, user_message: str) -> list:
+        """
+        Получение РЕЛЕВАНТНЫХ записей из базы знаний с гибридным поиском
+        
+        Args:
+            user_message: Вопрос пользователя
+            
+        Returns:
+            Список записей или пустой список
+        """
+        if not self.knowledge_service:
+            return []
+        
+        return await self.knowledge_service.retrieve_knowledge_async(
+            user_query=user_message,  # Передаём вопрос для поиска
+            max_items=config.AI_KNOWLEDGE_MAX_ITEMS
+        )
+    
+    async def _get_history(self, user_id: int = None) -> list:
+        """
+        Получение истории диалога, если известен пользователь
+        
+        Args:
+            user_id: ID пользователя
+            
+        Returns:
+            Список сообщений истории
+        """
+        if not (user_id and self.conversation_service):
+            return []
+        
+        return await self.conversation_service.get_user_history_async(
+            user_id, limit=config.AI_HISTORY_MAX_MESSAGES
+        )
+    
+    async def _save_history(self, user_id: int, username: str, user_name: str,
+                            user_message: str, ai_response: str):
+        """
+        Сохранение сообщения пользователя и ответа AI в историю
+        
+        Args:
+            user_id: ID пользователя
+            username: Username пользователя (без @)
+            user_name: Имя пользователя
+            user_message: Текст сообщения пользователя
+            ai_response: Ответ AI
+        """
+        if not (user_id and self.conversation_service):
+            return
+        
+        await self.conversation_service.add_message_async(
+            user_id, username, user_name, 'user', user_message
+        )
+        await self.conversation_service.add_message_async(
+            user_id, username, user_name, 'assistant', ai_response
+        )
+    
+    def get_response_cache_stats(self) -> dict:
+        """
+        Статистика семантического кэша ответов
+        
+        Returns:
+            Словарь со счётчиками или пустой словарь, если кэш выключен
+        """
+        return self.response_cache.get_stats() if self.response_cache else {}
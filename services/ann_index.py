@@ -0,0 +1,228 @@
+"""Приближённый поиск ближайших соседей (HNSW) для больших баз знаний"""
+
+import json
+import os
+import threading
+from typing import List, Tuple
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # Без hnswlib используется точный поиск
+    hnswlib = None
+
+# Версия формата файла метаданных; при изменении индекс перестраивается
+ANN_FORMAT = 1
+
+
+class AnnIndex:
+    """Класс-обёртка над индексом HNSW с метками — ID фрагментов"""
+    
+    def __init__(self, path: str, dim: int, model_name: str = '', dtype: str = 'float32',
+                 m: int = 16, ef_construction: int = 200, ef_search: int = 64):
+        """
+        Инициализация индекса (без загрузки данных)
+        
+        Args:
+            path: Путь к файлу индекса на диске (метаданные — в <path>.json)
+            dim: Размерность векторов
+            model_name: Модель embeddings, векторами которой заполнен индекс
+            dtype: Формат резидентного индекса, из которого взяты векторы
+            m: Число связей узла графа (больше — точнее и больше памяти)
+            ef_construction: Ширина поиска при построении (больше — точнее и медленнее)
+            ef_search: Ширина поиска при запросе — баланс полноты и скорости
+        """
+        self.path = path
+        self.meta_path = f"{path}.json"
+        self.dim = dim
+        self.model_name = model_name
+        self.dtype = dtype
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        
+        # hnswlib не допускает поиск одновременно с resize_index и save_index
+        self._lock = threading.Lock()
+        self._index = None
+        self._live_count = 0  # Векторов без пометки удаления
+    
+    @staticmethod
+    def is_available() -> bool:
+        """hnswlib установлен"""
+        return hnswlib is not None
+    
+    def _meta(self) -> dict:
+        """Метаданные, которым должен соответствовать файл индекса"""
+        return {
+            'format': ANN_FORMAT,
+            'dim': self.dim,
+            'model': self.model_name,
+            'dtype': self.dtype,
+        }
+    
+    def _file_matches(self) -> bool:
+        """
+        Проверка, что файл индекса построен для той же размерности, модели и формата
+        
+        hnswlib.load_index не сверяет размерность: файл другой модели загрузился бы
+        без ошибки и выдавал бы бессмысленные сходства.
+        
+        Returns:
+            True, если метаданные совпадают с текущими
+        """
+        try:
+            with open(self.meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            print("У ANN-индекса нет метаданных, он будет построен заново")
+            return False
+        
+        if meta != self._meta():
+            print(f"ANN-индекс построен для другой модели или размерности "
+                  f"({meta.get('model')}, dim={meta.get('dim')}, {meta.get('dtype')}), будет построен заново")
+            return False
+        return True
+    
+    def _create(self, capacity: int):
+        """
+        Создание пустого индекса
+        
+        Args:
+            capacity: Начальная вместимость
+        """
+        index = hnswlib.Index(space='ip', dim=self.dim)
+        index.init_index(
+            max_elements=max(capacity, 1024),
+            ef_construction=self.ef_construction,
+            M=self.m,
+            allow_replace_deleted=True
+        )
+        index.set_ef(self.ef_search)
+        return index
+    
+    def load_or_build(self, chunk_ids: np.ndarray, matrix: np.ndarray):
+        """
+        Загрузка индекса с диска и сверка с актуальными фрагментами либо построение заново
+        
+        Фрагменты, удалённые из БД после сохранения, помечаются удалёнными,
+        недостающие — добавляются. Файл другой размерности, модели или формата
+        (по метаданным рядом с ним) перестраивается.
+        
+        Args:
+            chunk_ids: ID фрагментов из БД
+            matrix: Нормализованные векторы фрагментов в том же порядке
+        """
+        index = None
+        if os.path.exists(self.path) and self._file_matches():
+            try:
+                index = hnswlib.Index(space='ip', dim=self.dim)
+                index.load_index(self.path, allow_replace_deleted=True)
+                index.set_ef(self.ef_search)
+            except Exception as e:
+                print(f"Не удалось загрузить ANN-индекс {self.path}, будет построен заново: {e}")
+                index = None
+        
+        rebuilt = index is None
+        if rebuilt:
+            index = self._create(len(chunk_ids))
+            indexed = set()
+        else:
+            indexed = set(index.get_ids_list())
+        
+        actual = set(int(chunk_id) for chunk_id in chunk_ids)
+        stale = indexed - actual
+        missing = np.array([int(chunk_id) not in indexed for chunk_id in chunk_ids], dtype=bool)
+        
+        with self._lock:
+            self._index = index
+            self._live_count = len(indexed & actual)
+        
+        removed = self.remove(stale)
+        if missing.any():
+            self.add(chunk_ids[missing], matrix[missing])
+        
+        print(f"ANN-индекс готов: {len(actual)} векторов "
+              f"(добавлено {int(missing.sum())}, удалено {removed})")
+        
+        if rebuilt or missing.any() or removed:
+            self.save()
+    
+    def add(self, chunk_ids, vectors: np.ndarray):
+        """
+        Добавление векторов, при необходимости с расширением индекса
+        
+        Args:
+            chunk_ids: ID фрагментов
+            vectors: Нормализованные векторы
+        """
+        if not len(chunk_ids):
+            return
+        
+        with self._lock:
+            free_slots = self._index.get_max_elements() - self._index.get_current_count()
+            if free_slots < len(chunk_ids):
+                self._index.resize_index(
+                    max(self._index.get_max_elements() * 2,
+                        self._index.get_current_count() + len(chunk_ids))
+                )
+            self._index.add_items(
+                np.asarray(vectors, dtype=np.float32),
+                np.asarray(chunk_ids, dtype=np.int64),
+                replace_deleted=True
+            )
+            self._live_count += len(chunk_ids)
+    
+    def remove(self, chunk_ids) -> int:
+        """
+        Пометка векторов удалёнными (место переиспользуется следующими добавлениями)
+        
+        Args:
+            chunk_ids: ID фрагментов
+            
+        Returns:
+            Количество помеченных векторов
+        """
+        removed = 0
+        with self._lock:
+            for chunk_id in chunk_ids:
+                try:
+                    self._index.mark_deleted(int(chunk_id))
+                    removed += 1
+                except RuntimeError:
+                    pass  # Уже удалён или не добавлялся
+            self._live_count -= removed
+        return removed
+    
+    def search(self, query_embedding: np.ndarray, k: int) -> Tuple[List[int], List[float]]:
+        """
+        Приближённый поиск k ближайших фрагментов
+        
+        Args:
+            query_embedding: Нормализованный вектор запроса
+            k: Количество результатов
+        
+        Returns:
+            Кортеж (ID фрагментов, косинусные сходства) по убыванию сходства
+        """
+        with self._lock:
+            k = min(k, self._live_count)
+            if k <= 0:
+                return [], []
+            labels, distances = self._index.knn_query(query_embedding.reshape(1, -1), k=k)
+        
+        # Для space='ip' расстояние равно 1 - скалярное произведение
+        return [int(label) for label in labels[0]], [1.0 - float(distance) for distance in distances[0]]
+    
+    def save(self):
+        """Сохранение индекса на диск через временный файл, метаданные — последними"""
+        with self._lock:
+            if self._index is None:
+                return
+            tmp_path = f"{self.path}.tmp"
+            self._index.save_index(tmp_path)
+            os.replace(tmp_path, self.path)
+            
+            tmp_meta_path = f"{self.meta_path}.tmp"
+            with open(tmp_meta_path, 'w', encoding='utf-8') as f:
+                json.dump(self._meta(), f)
+            os.replace(tmp_meta_path, self.meta_path)
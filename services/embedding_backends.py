@@ -0,0 +1,112 @@
+"""Загрузка модели embeddings на выбранном бэкенде: PyTorch или ONNX Runtime"""
+
+import os
+import sys
+sys.path.append('..')
+import config
+
+# Бэкенды, которые понимает load_embedding_model
+BACKENDS = ('torch', 'onnx')
+
+
+def _onnx_session_options(threads: int):
+    """
+    Настройки сессии ONNX Runtime с ограничением потоков
+    
+    Args:
+        threads: Потоков на одну операцию (0 — по умолчанию)
+    
+    Returns:
+        SessionOptions или None, если ограничение не задано
+    """
+    if not threads:
+        return None
+    
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    return options
+
+
+def _load_torch(model_name: str, threads: int):
+    """
+    Загрузка модели sentence-transformers на PyTorch (CPU)
+    
+    Args:
+        model_name: Название модели
+        threads: Потоков на одну операцию (0 — по умолчанию)
+    
+    Returns:
+        Модель SentenceTransformer
+    """
+    from sentence_transformers import SentenceTransformer
+    
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    
+    return SentenceTransformer(model_name, device='cpu')
+
+
+def _load_onnx(model_name: str, threads: int, quantization: str = None):
+    """
+    Загрузка модели sentence-transformers на ONNX Runtime
+    
+    Токенизация и пулинг остаются теми же, что у PyTorch-версии, поэтому векторы
+    совместимы с уже сохранёнными. Квантизованная int8 модель экспортируется
+    один раз в EMBEDDING_ONNX_CACHE_DIR и дальше загружается оттуда.
+    
+    Args:
+        model_name: Название модели
+        threads: Потоков на одну операцию (0 — по умолчанию)
+        quantization: Конфигурация динамической int8 квантизации
+            ('avx2', 'avx512', 'avx512_vnni', 'arm64') или None
+    
+    Returns:
+        Модель SentenceTransformer с бэкендом ONNX
+    """
+    from sentence_transformers import SentenceTransformer
+    
+    model_kwargs = {'provider': 'CPUExecutionProvider'}
+    session_options = _onnx_session_options(threads)
+    if session_options is not None:
+        model_kwargs['session_options'] = session_options
+    
+    if not quantization:
+        return SentenceTransformer(model_name, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+    
+    local_dir = os.path.join(config.EMBEDDING_ONNX_CACHE_DIR, model_name.replace('/', '__'))
+    file_name = f"model_qint8_{quantization}.onnx"
+    
+    if not os.path.exists(os.path.join(local_dir, 'onnx', file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        
+        print(f"Экспорт int8 ONNX модели ({quantization}) в {local_dir}...")
+        base_model = SentenceTransformer(model_name, device='cpu', backend='onnx')
+        base_model.save(local_dir)
+        export_dynamic_quantized_onnx_model(base_model, quantization, local_dir)
+    
+    model_kwargs['file_name'] = f"onnx/{file_name}"
+    return SentenceTransformer(local_dir, device='cpu', backend='onnx', model_kwargs=model_kwargs)
+
+
+def load_embedding_model(model_name: str, backend: str = 'torch', threads: int = 0, quantization: str = None):
+    """
+    Загрузка модели embeddings на выбранном бэкенде
+    
+    Args:
+        model_name: Название модели sentence-transformers
+        backend: 'torch' или 'onnx'
+        threads: Потоков на одну операцию (0 — по умолчанию, все ядра)
+        quantization: Конфигурация int8 квантизации для ONNX или None
+    
+    Returns:
+        Модель с методами encode(List[str], batch_size=...) и get_sentence_embedding_dimension()
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд embeddings: {backend}")
+    
+    if backend == 'onnx':
+        return _load_onnx(model_name, threads, quantization)
+    return _load_torch(model_name, threads)
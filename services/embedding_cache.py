@@ -0,0 +1,111 @@
+"""Кэш embeddings поисковых запросов"""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+
+class EmbeddingCache:
+    """Класс LRU-кэша embeddings с ограничением по размеру и времени жизни"""
+    
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600):
+        """
+        Инициализация кэша
+        
+        Args:
+            max_size: Максимальное количество записей
+            ttl_seconds: Время жизни записи в секундах (0 — без ограничения)
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        
+        self._entries = OrderedDict()  # key -> (created_at, embedding)
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def make_key(text: str, model_name: str) -> Tuple[str, str]:
+        """
+        Ключ кэша: нормализованный текст запроса и имя модели
+        
+        Args:
+            text: Текст запроса
+            model_name: Имя модели embeddings
+            
+        Returns:
+            Кортеж (model_name, normalized_text)
+        """
+        return model_name, re.sub(r'\s+', ' ', text).strip().lower()
+    
+    def get(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        """
+        Получение embedding из кэша
+        
+        Args:
+            key: Ключ из make_key
+            
+        Returns:
+            Embedding или None, если записи нет или она устарела
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key: Tuple[str, str], embedding: np.ndarray) -> np.ndarray:
+        """
+        Сохранение embedding в кэш с вытеснением самых старых записей
+        
+        Args:
+            key: Ключ из make_key
+            embedding: Вектор embedding
+            
+        Returns:
+            Сохранённая копия вектора (только для чтения)
+        """
+        vector = np.array(embedding, dtype=np.float32)
+        vector.flags.writeable = False  # Один массив отдаётся всем вызывающим
+        
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        
+        return vector
+    
+    def get_stats(self) -> Dict:
+        """
+        Получение счётчиков кэша
+        
+        Returns:
+            Словарь {size, hits, misses, evictions, hit_rate}
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,141 @@
+"""Фоновый поток для вычисления embeddings с микро-батчингом"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+import numpy as np
+
+
+class EmbeddingWorker:
+    """Класс для вычисления embeddings вне event loop с объединением запросов в пачки"""
+    
+    _STOP = object()
+    
+    def __init__(self, model, batch_window_ms: float = 5, max_batch_size: int = 32):
+        """
+        Инициализация воркера и запуск выделенного потока
+        
+        Args:
+            model: Модель с методом encode(List[str], batch_size=...)
+            batch_window_ms: Сколько ждать дополнительные тексты после первого, мс
+            max_batch_size: Максимальный размер пачки
+        """
+        self.model = model
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch_size = max_batch_size
+        
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-worker", daemon=True)
+        self._thread.start()
+    
+    def submit(self, text: str) -> Future:
+        """
+        Постановка текста в очередь на кодирование
+        
+        Args:
+            text: Текст для кодирования
+            
+        Returns:
+            Future с вектором embedding
+        """
+        future = Future()
+        self._queue.put((text, future))
+        return future
+    
+    def encode(self, text: str) -> np.ndarray:
+        """
+        Синхронное кодирование текста (блокирует вызывающий поток до результата)
+        
+        Args:
+            text: Текст для кодирования
+            
+        Returns:
+            Вектор embedding
+        """
+        return self.submit(text).result()
+    
+    def encode_many(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Синхронное кодирование нескольких текстов (ставятся в очередь разом и уходят общей пачкой)
+        
+        Args:
+            texts: Тексты для кодирования
+            
+        Returns:
+            Список векторов embedding в порядке текстов
+        """
+        futures = [self.submit(text) for text in texts]
+        return [future.result() for future in futures]
+    
+    async def encode_async(self, text: str) -> np.ndarray:
+        """
+        Асинхронное кодирование текста без блокировки event loop
+        
+        Args:
+            text: Текст для кодирования
+            
+        Returns:
+            Вектор embedding
+        """
+        return await asyncio.wrap_future(self.submit(text))
+    
+    def close(self):
+        """Остановка потока после обработки уже поставленных текстов"""
+        self._queue.put(self._STOP)
+        self._thread.join()
+    
+    def _collect_batch(self) -> List[tuple]:
+        """
+        Сбор пачки: первый элемент ждём бесконечно, остальные — в пределах окна
+        
+        Returns:
+            Список пар (text, future); пустой список означает остановку
+        """
+        item = self._queue.get()
+        if item is self._STOP:
+            return []
+        
+        batch = [item]
+        deadline = time.monotonic() + self.batch_window
+        
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                # Дообрабатываем собранное и останавливаемся на следующей итерации
+                self._queue.put(self._STOP)
+                break
+            batch.append(item)
+        
+        return batch
+    
+    def _run(self):
+        """Основной цикл потока"""
+        while True:
+            batch = self._collect_batch()
+            if not batch:
+                return
+            
+            # Пропускаем запросы, которые уже отменили
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            
+            try:
+                texts = [text for text, _ in batch]
+                vectors = self.model.encode(texts, batch_size=len(texts))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
@@ -0,0 +1,178 @@
+"""Диспетчер входящих сообщений: очередь на пользователя и общий лимит запросов к LLM"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict
+
+# Сколько последних замеров ожидания хранится для статистики
+WAIT_SAMPLES = 1000
+
+
+class MessageDispatcher:
+    """Класс, который обрабатывает сообщения одного пользователя по порядку, а разных — параллельно"""
+    
+    def __init__(self, max_concurrent_requests: int, max_queue_size: int = 0, slow_wait_seconds: float = 5.0):
+        """
+        Инициализация диспетчера
+        
+        Args:
+            max_concurrent_requests: Максимум одновременных запросов к LLM по всем пользователям
+            max_queue_size: Максимум ожидающих сообщений одного пользователя (0 — без ограничения)
+            slow_wait_seconds: Ожидание дольше этого порога выводится в лог
+        """
+        self.max_concurrent_requests = max_concurrent_requests
+        self.max_queue_size = max_queue_size
+        self.slow_wait_seconds = slow_wait_seconds
+        
+        self._llm_semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        
+        # Наблюдаемость: текущая загрузка и последние времена ожидания
+        self._in_flight = 0
+        self._waiting_for_slot = 0
+        self._max_queue_depth = 0
+        self._processed = 0
+        self._dropped = 0
+        self._failed = 0
+        self._queue_waits = deque(maxlen=WAIT_SAMPLES)
+        self._slot_waits = deque(maxlen=WAIT_SAMPLES)
+    
+    def submit(self, user_id: int, job: Callable[[], Awaitable]) -> bool:
+        """
+        Постановка задачи в очередь пользователя без ожидания её выполнения
+        
+        Задачи одного пользователя выполняются строго по очереди, поэтому ответы
+        и записи истории не перемешиваются. Обработчик очереди завершается,
+        когда она пустеет, и создаётся заново при следующем сообщении.
+        
+        Args:
+            user_id: ID пользователя (ключ очереди)
+            job: Функция без аргументов, возвращающая корутину обработки
+        
+        Returns:
+            False, если очередь пользователя переполнена и задача отброшена
+        """
+        queue = self._queues.get(user_id)
+        if queue is None:
+            queue = self._queues[user_id] = asyncio.Queue()
+        
+        if self.max_queue_size and queue.qsize() >= self.max_queue_size:
+            self._dropped += 1
+            print(f"Очередь пользователя {user_id} переполнена ({queue.qsize()}), сообщение пропущено")
+            return False
+        
+        queue.put_nowait((time.monotonic(), job))
+        self._max_queue_depth = max(self._max_queue_depth, queue.qsize())
+        
+        if user_id not in self._workers:
+            self._workers[user_id] = asyncio.create_task(self._run_user_queue(user_id, queue))
+        return True
+    
+    async def _run_user_queue(self, user_id: int, queue: asyncio.Queue):
+        """
+        Последовательное выполнение задач из очереди пользователя
+        
+        Args:
+            user_id: ID пользователя
+            queue: Очередь задач пользователя
+        """
+        try:
+            while not queue.empty():
+                enqueued_at, job = queue.get_nowait()
+                
+                wait = time.monotonic() - enqueued_at
+                self._queue_waits.append(wait)
+                if wait >= self.slow_wait_seconds:
+                    print(f"Сообщение пользователя {user_id} ждало в очереди {wait:.1f} с "
+                          f"(ещё в очереди: {queue.qsize()})")
+                
+                try:
+                    await job()
+                    self._processed += 1
+                except Exception as e:
+                    self._failed += 1
+                    print(f"Ошибка при обработке задачи пользователя {user_id}: {e}")
+        finally:
+            # Между проверкой и удалением нет await, новая задача не потеряется
+            self._workers.pop(user_id, None)
+            if queue.empty():
+                self._queues.pop(user_id, None)
+    
+    @asynccontextmanager
+    async def llm_slot(self):
+        """
+        Место в общем пуле запросов к LLM на время самого запроса
+        
+        Отправка ответа в Telegram выполняется уже без места в пуле.
+        
+        Пример:
+            async with dispatcher.llm_slot():
+                response = await client.chat.completions.create(...)
+        """
+        requested_at = time.monotonic()
+        self._waiting_for_slot += 1
+        try:
+            await self._llm_semaphore.acquire()
+        finally:
+            self._waiting_for_slot -= 1
+        
+        wait = time.monotonic() - requested_at
+        self._slot_waits.append(wait)
+        if wait >= self.slow_wait_seconds:
+            print(f"Запрос к LLM ждал свободного места {wait:.1f} с "
+                  f"(выполняется: {self._in_flight}, ожидают: {self._waiting_for_slot})")
+        
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._llm_semaphore.release()
+    
+    @staticmethod
+    def _wait_summary(samples: deque) -> Dict:
+        """
+        Среднее, медиана, p95 и максимум по замерам ожидания
+        
+        Args:
+            samples: Замеры в секундах
+        
+        Returns:
+            Словарь со значениями в секундах (нули, если замеров нет)
+        """
+        if not samples:
+            return {'avg': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        
+        ordered = sorted(samples)
+        return {
+            'avg': sum(ordered) / len(ordered),
+            'p50': ordered[len(ordered) // 2],
+            'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            'max': ordered[-1],
+        }
+    
+    def get_stats(self) -> Dict:
+        """
+        Текущая загрузка диспетчера
+        
+        Returns:
+            Словарь: глубина очередей, запросы к LLM, счётчики задач и времена ожидания
+        """
+        depths = [queue.qsize() for queue in self._queues.values()]
+        return {
+            'active_users': len(self._workers),
+            'queued': sum(depths),
+            'max_user_queue': max(depths, default=0),
+            'max_queue_depth_seen': self._max_queue_depth,
+            'llm_in_flight': self._in_flight,
+            'llm_waiting': self._waiting_for_slot,
+            'llm_limit': self.max_concurrent_requests,
+            'processed': self._processed,
+            'failed': self._failed,
+            'dropped': self._dropped,
+            'queue_wait': self._wait_summary(self._queue_waits),
+            'llm_slot_wait': self._wait_summary(self._slot_waits),
+        }
@@ -0,0 +1,163 @@
+"""Сборка промпта для AI в пределах бюджета токенов"""
+
+from typing import Callable, Dict, List, Tuple
+import sys
+sys.path.append('..')
+from services.text_chunker import SENTENCE_BOUNDARY
+import config
+
+try:
+    import tiktoken
+except ImportError:  # Без tiktoken токены оцениваются по длине текста
+    tiktoken = None
+
+
+class PromptBuilder:
+    """Класс для сборки сообщений API с учётом бюджета токенов по разделам"""
+    
+    # Меньше этого остатка бюджета запись не обрезается, а отбрасывается
+    MIN_TRUNCATED_TOKENS = 40
+    
+    def __init__(self, item_formatter: Callable[[Dict], str]):
+        """
+        Инициализация сборщика промпта
+        
+        Args:
+            item_formatter: Функция форматирования одной записи базы знаний
+        """
+        self.item_formatter = item_formatter
+        self._encoding = None
+        
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(config.AI_TOKENIZER_ENCODING)
+            except Exception as e:
+                print(f"Не удалось загрузить токенизатор {config.AI_TOKENIZER_ENCODING}, используется оценка: {e}")
+    
+    def count_tokens(self, text: str) -> int:
+        """
+        Подсчёт токенов в тексте
+        
+        Args:
+            text: Текст
+            
+        Returns:
+            Количество токенов (точное с tiktoken, иначе оценка по символам)
+        """
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return int(len(text) / config.AI_CHARS_PER_TOKEN) + 1
+    
+    def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """
+        Обрезка текста по границе предложения так, чтобы уложиться в бюджет
+        
+        Args:
+            text: Исходный текст
+            max_tokens: Бюджет токенов
+            
+        Returns:
+            Обрезанный текст или пустая строка, если не помещается даже первое предложение
+        """
+        if self.count_tokens(text) <= max_tokens:
+            return text
+        
+        result = ""
+        for match in SENTENCE_BOUNDARY.finditer(text + "\n"):
+            candidate = text[:match.start()].rstrip()
+            if self.count_tokens(candidate + " …") > max_tokens:
+                break
+            result = candidate
+        
+        return f"{result} …" if result else ""
+    
+    def build(self, system_prompt: str, knowledge_items: List[Dict], history: List[Dict],
+              user_message: str) -> Tuple[List[Dict], Dict]:
+        """
+        Сборка сообщений для API в пределах AI_PROMPT_TOKEN_BUDGET
+        
+        Системный промпт и вопрос включаются всегда. Затем записи базы знаний
+        в порядке релевантности (ниже AI_KNOWLEDGE_MIN_SIMILARITY отбрасываются,
+        не влезающая запись обрезается по предложениям) в пределах
+        AI_KNOWLEDGE_TOKEN_BUDGET, и на остаток — история от новых сообщений к старым.
+        
+        Args:
+            system_prompt: Базовый системный промпт
+            knowledge_items: Записи базы знаний по убыванию релевантности
+            history: История диалога (старые первыми)
+            user_message: Текущее сообщение пользователя
+            
+        Returns:
+            Кортеж (messages, report), где report — токены по разделам
+        """
+        report = {
+            'system': self.count_tokens(system_prompt),
+            'user': self.count_tokens(user_message),
+            'knowledge': 0,
+            'history': 0,
+            'knowledge_items': 0,
+            'knowledge_dropped': 0,
+            'history_messages': 0,
+        }
+        remaining = config.AI_PROMPT_TOKEN_BUDGET - report['system'] - report['user']
+        
+        # База знаний: по релевантности, в пределах своего бюджета
+        knowledge_parts = []
+        knowledge_budget = min(config.AI_KNOWLEDGE_TOKEN_BUDGET, remaining)
+        header = "\n\nБаза знаний:"
+        header_tokens = self.count_tokens(header)
+        
+        for item in knowledge_items:
+            similarity = item.get('similarity')
+            if similarity is not None and similarity < config.AI_KNOWLEDGE_MIN_SIMILARITY:
+                report['knowledge_dropped'] += 1
+                continue
+            
+            available = knowledge_budget - report['knowledge'] - (0 if knowledge_parts else header_tokens)
+            text = self.item_formatter(item)
+            tokens = self.count_tokens(text)
+            
+            if tokens > available:
+                text = self.truncate_to_tokens(text, available) if available >= self.MIN_TRUNCATED_TOKENS else ""
+                if not text:
+                    report['knowledge_dropped'] += 1
+                    continue
+                tokens = self.count_tokens(text)
+            
+            if not knowledge_parts:
+                report['knowledge'] += header_tokens
+            knowledge_parts.append(text)
+            report['knowledge'] += tokens
+            report['knowledge_items'] += 1
+        
+        if knowledge_parts:
+            system_prompt += header + "".join(f"\n\n{part}" for part in knowledge_parts)
+        remaining -= report['knowledge']
+        
+        # История: от последних сообщений к более старым, пока хватает бюджета
+        history_messages = []
+        for msg in reversed(history):
+            tokens = self.count_tokens(msg['message'])
+            if tokens > remaining - report['history']:
+                break
+            history_messages.append({"role": msg['role'], "content": msg['message']})
+            report['history'] += tokens
+        history_messages.reverse()
+        report['history_messages'] = len(history_messages)
+        
+        report['total'] = report['system'] + report['user'] + report['knowledge'] + report['history']
+        
+        messages = [{"role": "system", "content": system_prompt}]
+        messages.extend(history_messages)
+        messages.append({"role": "user", "content": user_message})
+        
+        print(
+            f"Промпт: {report['total']}/{config.AI_PROMPT_TOKEN_BUDGET} токенов "
+            f"(система {report['system']}, знания {report['knowledge']} "
+            f"[{report['knowledge_items']} зап., отброшено {report['knowledge_dropped']}], "
+            f"история {report['history']} [{report['history_messages']} сообщ.], вопрос {report['user']})"
+        )
+        
+        return messages, report
@@ -0,0 +1,153 @@
+"""Семантический кэш ответов AI"""
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+
+class SemanticResponseCache:
+    """Класс кэша ответов AI с поиском по близости embeddings вопросов"""
+    
+    def __init__(self, similarity_threshold: float = 0.95, max_size: int = 500,
+                 ttl_seconds: float = 6 * 3600):
+        """
+        Инициализация кэша
+        
+        Args:
+            similarity_threshold: Минимальное косинусное сходство вопросов для выдачи ответа из кэша
+            max_size: Максимальное количество сохранённых ответов
+            ttl_seconds: Время жизни ответа в секундах (0 — без ограничения)
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        
+        # entry_id -> {embedding, knowledge_ids, answer, created_at}
+        self._entries = OrderedDict()
+        self._next_id = itertools.count(1)
+        self._lock = threading.Lock()
+        
+        # Растёт при каждом изменении базы знаний; ответ, начатый до изменения, не сохраняется
+        self.version = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def lookup(self, question_embedding: np.ndarray) -> Optional[str]:
+        """
+        Поиск ответа на близкий по смыслу вопрос
+        
+        Args:
+            question_embedding: Нормализованный embedding вопроса
+            
+        Returns:
+            Ответ из кэша или None
+        """
+        with self._lock:
+            self._evict_expired()
+            
+            if not self._entries:
+                self.misses += 1
+                return None
+            
+            entry_ids = list(self._entries)
+            matrix = np.vstack([self._entries[entry_id]['embedding'] for entry_id in entry_ids])
+            similarities = matrix @ question_embedding
+            best = int(np.argmax(similarities))
+            
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+            
+            entry_id = entry_ids[best]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            print(f"Ответ из семантического кэша (сходство {similarities[best]:.3f})")
+            return self._entries[entry_id]['answer']
+    
+    def store(self, question_embedding: np.ndarray, knowledge_ids: Iterable[int], answer: str,
+              version: int):
+        """
+        Сохранение ответа вместе с записями базы знаний, на которых он основан
+        
+        Args:
+            question_embedding: Нормализованный embedding вопроса
+            knowledge_ids: ID записей, попавших в контекст ответа
+            answer: Ответ AI
+            version: Значение version на момент отбора контекста
+        """
+        with self._lock:
+            if version != self.version:
+                # База знаний изменилась, пока генерировался ответ
+                return
+            
+            self._entries[next(self._next_id)] = {
+                'embedding': np.asarray(question_embedding, dtype=np.float32),
+                'knowledge_ids': frozenset(knowledge_ids),
+                'answer': answer,
+                'created_at': time.monotonic(),
+            }
+            
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def on_knowledge_changed(self, knowledge_id: int, action: str):
+        """
+        Инвалидация по изменению базы знаний (подписчик KnowledgeService)
+        
+        Изменённая или удалённая запись сбрасывает ответы, в контекст которых она входила.
+        Новая запись может оказаться релевантнее закэшированных, поэтому кэш очищается целиком.
+        
+        Args:
+            knowledge_id: ID изменённой записи
+            action: 'add', 'update' или 'delete'
+        """
+        with self._lock:
+            self.version += 1
+            
+            if action == 'add':
+                stale = list(self._entries)
+            else:
+                stale = [
+                    entry_id for entry_id, entry in self._entries.items()
+                    if knowledge_id in entry['knowledge_ids']
+                ]
+            
+            for entry_id in stale:
+                del self._entries[entry_id]
+            self.invalidations += len(stale)
+    
+    def get_stats(self) -> Dict:
+        """
+        Получение счётчиков кэша
+        
+        Returns:
+            Словарь {size, hits, misses, evictions, invalidations, hit_rate}
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+    
+    def _evict_expired(self):
+        """Удаление устаревших записей (вызывается под блокировкой)"""
+        if not self.ttl_seconds:
+            return
+        
+        deadline = time.monotonic() - self.ttl_seconds
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry['created_at'] < deadline]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        self.evictions += len(expired)
@@ -0,0 +1,64 @@
+"""Корень композиции: общие сервисы для пользовательского бота и админ-бота"""
+
+import sys
+import threading
+sys.path.append('..')
+from database.db_service import DatabaseService
+from database.knowledge_service import KnowledgeService
+from database.conversation_service import ConversationService
+from database.retention_service import RetentionService
+from services.ai_service import AIService
+from services.message_dispatcher import MessageDispatcher
+import config
+
+
+class ServiceContainer:
+    """Класс, который создаёт БД, модель и сервисы один раз на процесс"""
+    
+    def __init__(self, db_path: str = config.DATABASE_PATH):
+        """
+        Инициализация общих сервисов
+        
+        Args:
+            db_path: Путь к файлу базы данных SQLite
+        """
+        # Схема и миграции применяются один раз
+        self.db_service = DatabaseService(db_path)
+        
+        # Одна модель и один индекс embeddings: правки из админки сразу видны пользователям.
+        # Модель и индекс загружаются в start_warm_up(), не задерживая создание сервисов
+        self.knowledge_service = KnowledgeService(self.db_service)
+        self.conversation_service = ConversationService(self.db_service)
+        
+        # Очереди пользователей и общий лимит запросов к LLM; статистика видна в админке
+        self.message_dispatcher = MessageDispatcher(
+            config.LLM_MAX_CONCURRENT_REQUESTS,
+            max_queue_size=config.USER_QUEUE_MAX_SIZE,
+            slow_wait_seconds=config.DISPATCHER_SLOW_WAIT_SECONDS
+        )
+        
+        self.ai_service = AIService(
+            self.knowledge_service, self.conversation_service,
+            llm_slot=self.message_dispatcher.llm_slot
+        )
+        
+        # Фоновая задача архивирования истории запускается в event loop из main.py
+        self.retention_service = None
+        if config.HISTORY_RETENTION_ENABLED:
+            self.retention_service = RetentionService(self.db_service)
+    
+    def start_warm_up(self):
+        """
+        Фоновая загрузка модели, индекса и клиента OpenAI
+        
+        Вызывается до подключения Telegram-клиентов, чтобы загрузка шла параллельно;
+        ранние сообщения ждут готовности базы знаний.
+        """
+        self.knowledge_service.start_warm_up()
+        threading.Thread(target=self.ai_service.warm_up, name="ai-warm-up", daemon=True).start()
+    
+    def close(self):
+        """Освобождение ресурсов сервисов"""
+        self.knowledge_service.close()
+        self.conversation_service.close()  # Дописывает очередь истории до закрытия БД
+        self.db_service.close()
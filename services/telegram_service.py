@@ -1,6 +1,10 @@
 """Сервис для работы с Telegram"""
 
+import asyncio
+import time
+from typing import AsyncIterator
 from telethon.sync import TelegramClient
+from telethon.errors import FloodWaitError, MessageNotModifiedError
 import sys
 sys.path.append('..')
 import config
@@ -36,6 +40,78 @@ class TelegramService:
             print(f"Ошибка при отправке сообщения: {e}")
             raise
     
+    async def send_streaming_message(self, event, chunks: AsyncIterator[str]) -> str:
+        """
+        Потоковая отправка ответа: сообщение отправляется с первыми фрагментами
+        и затем редактируется не чаще STREAM_EDIT_INTERVAL
+        
+        Args:
+            event: Событие Telegram
+            chunks: Асинхронный итератор фрагментов текста
+            
+        Returns:
+            Полный отправленный текст
+        """
+        text = ""
+        sent_text = ""
+        message = None
+        next_edit_at = 0.0
+        
+        async for chunk in chunks:
+            text += chunk
+            
+            if message is None:
+                if text.strip():
+                    message = await event.respond(text)
+                    sent_text = text
+                    next_edit_at = time.monotonic() + config.STREAM_EDIT_INTERVAL
+                continue
+            
+            if time.monotonic() < next_edit_at or len(text) - len(sent_text) < config.STREAM_MIN_CHARS_DELTA:
+                continue
+            
+            next_edit_at = await self._edit_streamed_message(message, text)
+            sent_text = text
+        
+        text = text.strip()
+        
+        if message is None:
+            if text:
+                await self.send_message(event, text)
+            return text
+        
+        # Финальная правка с полным текстом
+        if text != sent_text:
+            delay = next_edit_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await self._edit_streamed_message(message, text)
+        
+        return text
+    
+    async def _edit_streamed_message(self, message, text: str) -> float:
+        """
+        Правка сообщения с учётом ограничений Telegram
+        
+        Args:
+            message: Отправленное сообщение
+            text: Новый текст
+            
+        Returns:
+            Момент (time.monotonic), раньше которого следующая правка не делается
+        """
+        try:
+            await message.edit(text)
+        except MessageNotModifiedError:
+            pass
+        except FloodWaitError as e:
+            print(f"Telegram ограничил частоту правок, пауза {e.seconds} с")
+            return time.monotonic() + e.seconds
+        except Exception as e:
+            print(f"Ошибка при редактировании сообщения: {e}")
+        
+        return time.monotonic() + config.STREAM_EDIT_INTERVAL
+    
     def get_client(self) -> TelegramClient:
         """Получение экземпляра клиента"""
         return self.client
@@ -0,0 +1,96 @@
+"""Разбиение длинных текстов на перекрывающиеся фрагменты для поиска"""
+
+import re
+from typing import List
+
+# Граница предложения: после . ! ? … или перевод строки
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+|\n+')
+
+
+def _split_long_sentence(sentence: str, max_chars: int) -> List[str]:
+    """
+    Разбиение предложения длиннее max_chars по словам
+    
+    Args:
+        sentence: Текст предложения
+        max_chars: Максимальная длина части
+        
+    Returns:
+        Список частей не длиннее max_chars (кроме слов, которые длиннее сами по себе)
+    """
+    parts = []
+    current = ""
+    for word in sentence.split():
+        if current and len(current) + 1 + len(word) > max_chars:
+            parts.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_into_passages(text: str, max_chars: int, overlap_chars: int) -> List[str]:
+    """
+    Разбиение текста на фрагменты по границам предложений с перекрытием
+    
+    Фрагмент набирается из целых предложений, пока не превысит max_chars.
+    Следующий фрагмент начинается с последних предложений предыдущего
+    общей длиной не больше overlap_chars, чтобы мысль на стыке не терялась.
+    
+    Args:
+        text: Исходный текст
+        max_chars: Максимальная длина фрагмента в символах
+        overlap_chars: Максимальная длина перекрытия соседних фрагментов
+        
+    Returns:
+        Список фрагментов; короткий текст возвращается одним фрагментом
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if len(text) <= max_chars:
+        return [text]
+    
+    sentences = []
+    for sentence in SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) > max_chars:
+            sentences.extend(_split_long_sentence(sentence, max_chars))
+        else:
+            sentences.append(sentence)
+    
+    passages = []
+    current = []
+    current_len = 0
+    
+    for sentence in sentences:
+        if current and current_len + 1 + len(sentence) > max_chars:
+            passages.append(" ".join(current))
+            
+            # Перекрытие: хвост предыдущего фрагмента из целых предложений
+            overlap = []
+            overlap_len = 0
+            for previous in reversed(current):
+                if overlap_len + len(previous) + 1 > overlap_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_len += len(previous) + 1
+            
+            # Перекрытие не должно вытеснять новое предложение из фрагмента
+            while overlap and overlap_len + len(sentence) > max_chars:
+                overlap_len -= len(overlap.pop(0)) + 1
+            
+            current = overlap
+            current_len = max(overlap_len - 1, 0)
+        
+        current.append(sentence)
+        current_len += len(sentence) + (1 if len(current) > 1 else 0)
+    
+    if current:
+        passages.append(" ".join(current))
+    
+    return passages